@@ -0,0 +1,55 @@
+import sys
+import os
+import asyncio
+import argparse
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.graph_client import GraphClient
+from utils.cleanup import CleanupEngine, DEFAULT_NAME_MARKER
+
+
+async def sweep(name_marker: str = DEFAULT_NAME_MARKER, batched: bool = True):
+    """
+    Delete the service principals and application objects left behind by earlier collection runs,
+    i.e. the ones whose display name starts with the name marker used by collect.py.
+    """
+
+    client = GraphClient()
+
+    def on_done(job, deleted):
+        if not deleted:
+            print(f"\tError while removing {job}")
+
+    cleanup = CleanupEngine(client, batched=batched, on_done=on_done)
+    cleanup.start()
+
+    try:
+        orphans = await cleanup.sweep_orphans(name_marker)
+        print(f"Found {orphans} orphaned objects with display name starting with '{name_marker}'.")
+
+        await cleanup.join()
+        await client.flush()
+    finally:
+        # no-op after join(); on errors the queued deletions are dropped
+        await cleanup.stop()
+        try:
+            await client.credential.close()
+        finally:
+            await client.transport.aclose()
+
+    print(f"Deleted {cleanup.deleted} objects, {cleanup.failed} failed.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Delete the objects left behind by earlier collection runs.")
+    parser.add_argument("--name-marker", default=DEFAULT_NAME_MARKER, help=f"display name prefix of the objects to delete (default: '{DEFAULT_NAME_MARKER}')")
+    parser.add_argument("--no-batch", action="store_true", help="delete the objects one request at a time instead of using JSON batches")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(sweep(name_marker=args.name_marker, batched=not args.no_batch))
+    print("\nEnd of Script.")
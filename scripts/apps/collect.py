@@ -1,104 +1,658 @@
 import sys
 import os
 import asyncio
-import json
+import argparse
+import heapq
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # Aggiunge la root del progetto al PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from utils.graph_client import GraphClient 
+from utils.catalog_cache import TemplateCatalogCache, fingerprint
+from utils.cleanup import CleanupEngine, DEFAULT_NAME_MARKER
+from utils.app_index import AppIndex
+from utils.columnar import export_columnar
+from utils.errors import GraphThrottledError, classify_error
+from utils.journal import CollectionJournal, FAILED, INSTANTIATED, PENDING
+from utils.profiles import CredentialProfile, load_profiles, shard_of
+from utils.serializer import to_serializable
+from utils.template_history import TemplateHistory
+from utils.transport import GraphTransport
+from utils.writer import CollectionWriter
 
-# Utility function for serialization
-def to_serializable(obj):
+
+# Template fields downloaded from the gallery: the metadata is used to detect the changed templates (--incremental)
+TEMPLATE_FIELDS = [
+    "id",
+    "display_name",
+    "description",
+    "publisher",
+    "categories",
+    "home_page_url",
+    "logo_url",
+    "supported_provisioning_types",
+    "supported_single_sign_on_modes",
+]
+
+
+class PipelineStats:
     """
-    Try to convert an object to a dictionary recursively,
-    skipping non-serializable attributes.
+    Shared counters for the collection pipeline, used to report progress
+    and throughput (templates/sec) while the workers are running.
     """
-    if isinstance(obj, list):
-        return [to_serializable(item) for item in obj]
-    elif hasattr(obj, "__dict__"):
-        return {key: to_serializable(value) for key, value in vars(obj).items() if not key.startswith("_")}
-    elif isinstance(obj, (str, int, float, bool)) or obj is None:
-        return obj
-    else:
-        return str(obj)  # fallback to string
+
+    def __init__(self, total: int):
+        self.total = total
+        self.processed = 0      # templates that went through the instantiate stage
+        self.instantiated = 0   # templates successfully instantiated
+        self.deleted = 0        # service principals removed by the cleanup stage
+        self.throttled = 0      # templates still throttled after all the retries (re-queued in a later pass)
+        self.start_time = time.monotonic()
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        percentage = (self.processed / self.total) * 100 if self.total else 100
+        print(
+            f"Progress: {self.processed}/{self.total} templates ({percentage:.2f}%), "
+            f"{self.instantiated} instantiated, {self.deleted} cleaned up, {self.throttled} throttled, "
+            f"{self.throughput():.2f} templates/sec"
+        )
+
+
+def strip_name_marker(record: dict, marker: str):
+    """
+    Remove the display name marker added at instantiation, so that the output keeps the template display names.
+    """
+    for field in ("display_name", "app_display_name"):
+        value = record.get(field)
+        if marker and isinstance(value, str) and value.startswith(marker):
+            record[field] = value[len(marker):]
+    return record
+
+
+def cleanup_leftovers(cleanup: CleanupEngine, journal: CollectionJournal, keep_states: bool = True):
+    """
+    Submit the deletion of the objects left behind by an interrupted run, according to the journal.
+
+    Templates interrupted before their data was saved go back to pending, so that they are collected again,
+    while templates already collected are marked as deleted once their objects are removed.
+
+    Args:
+        keep_states (bool): False if the journal is reset afterwards (a new run from scratch): the objects are deleted
+            without updating the journal, whose rows then belong to the templates of the new run.
+    """
+
+    leftovers = journal.leftovers()
+    if not leftovers:
+        return
+
+    print(f"Cleaning up {len(leftovers)} applications left by the previous run.")
+
+    for template_id, state, service_principal_id, application_id in leftovers:
+        if state == INSTANTIATED:
+            journal.mark_pending(template_id)
+            template_id = None  # nothing to record once deleted
+        cleanup.submit(service_principal_id, application_id, key=template_id if keep_states else None)
 
 
-async def collect():
+async def try_sweep_orphans(cleanup: CleanupEngine, name_marker: str):
+    """
+    Submit the deletion of the objects carrying the marker left behind by earlier runs, best-effort: if the listing
+    fails, the run goes on and the remaining orphans are found again by the next run.
+
+    Returns:
+        int: Number of orphaned objects submitted for deletion.
+    """
+    try:
+        return await cleanup.sweep_orphans(name_marker)
+    except Exception as e:
+        print(f"Orphan sweep failed ({e!r}): the remaining orphans will be swept by the next run.\n")
+        return 0
+
+
+async def collect(workers: int = 8, queue_size: int = 64, progress_interval: float = 5.0, verbose: bool = False, throttle_passes: int = 3,
+                  batch_cleanup: bool = True, resume: bool = False, journal_path: str = "data/collect_journal.sqlite",
+                  writer: CollectionWriter = None, catalog_ttl: float = 24 * 3600, refresh_catalog: bool = False,
+                  incremental: bool = False, negative_cache: bool = True, history_path: str = "data/cache/template_history.json",
+                  name_marker: str = DEFAULT_NAME_MARKER, sweep_orphans: bool = True, max_connections: int = 100, http2: bool = True,
+                  profile: CredentialProfile = None, shard: tuple = None, transport: GraphTransport = None,
+                  metrics_path: str = None, app_fields: list = None, sp_fields: list = None):
     """
     Instantiate applications from Microsoft Entra application templates.
     For each successfully instantiated application, retrieve the application and service principal information,
     and update two json files with all apps sp and app info.
     Finally delete the instatiated application.
-    """
 
-    client = GraphClient()
+    The work is organised as a pipeline of overlapping asyncio stages connected by bounded queues:
+    - instantiate: `workers` tasks POST to /instantiate concurrently
+    - serialize: converts the returned objects into serializable dictionaries and hands them to the writer
+    - cleanup: a background CleanupEngine deletes the service principals and the application objects
+      (grouped in JSON batches of up to 20 deletions), without blocking the other stages
 
+    Templates whose instantiation is still throttled after the client retries are not counted as failures:
+    they are collected again in a later pass (up to `throttle_passes` passes).
 
-    #list of application objects
-    all_applications = []
-    #list of service principals list
-    all_service_principals = []
+    The state of every template (pending, instantiated, collected, deleted, failed) and the collected data are
+    committed to a SQLite journal as the run goes. With `resume`, the templates already finished by a previous
+    (interrupted) run are skipped and their data is read back from the journal. In both cases the service
+    principals left behind by the previous run are deleted first.
 
-    templates = await client.list_application_template()
+    With `incremental`, the journal of the previous run is used as its manifest: only the templates that are new,
+    whose metadata changed or that were not finished are instantiated, and their results are merged with the data
+    of the unchanged templates. Templates no longer in the gallery are dropped from the output.
+
+    The outcome and duration of every instantiation are kept in a persistent TemplateHistory. With `negative_cache`,
+    templates that failed recently are skipped until their entry expires (permanent errors are re-probed much more
+    rarely than transient ones), and the remaining templates are started slowest first.
+
+    Applications are instantiated with `name_marker` in front of their display name (removed from the output).
+    With `sweep_orphans`, the objects carrying the marker that earlier runs failed to delete are removed too.
+
+    With `shard`, only the templates of the given shard are collected (see collect_sharded()).
+
+    Args:
+        workers (int): Number of concurrent instantiate workers (without batch_cleanup, the cleanup stage uses half of them).
+        queue_size (int): Maximum number of items waiting between two stages.
+        progress_interval (float): Seconds between two progress reports.
+        verbose (bool): If True, print a line for every template.
+        throttle_passes (int): Maximum number of passes over the templates that were throttled.
+        batch_cleanup (bool): If True, the service principal deletions are sent through Graph JSON batches.
+        resume (bool): If True, continue the run recorded in the journal instead of starting from scratch.
+        journal_path (str): Path of the SQLite journal of the run.
+        writer (CollectionWriter, optional): Output stage of the run. Defaults to the json layout under data/.
+        catalog_ttl (float): Seconds a cached template catalog is used without downloading it again.
+        refresh_catalog (bool): If True, download the template catalog even if the cached one is still fresh.
+        incremental (bool): If True, only collect the templates that are new or changed since the previous run.
+        negative_cache (bool): If True, skip the templates that failed recently (see TemplateHistory).
+        history_path (str): Path of the JSON file of the template history.
+        name_marker (str): Prefix of the display names of the instantiated applications.
+        sweep_orphans (bool): If True, delete the objects carrying the marker left behind by earlier runs.
+        max_connections (int): Size of the HTTP connection pool.
+        http2 (bool): If True, use HTTP/2 when available (requires the h2 package).
+        profile (CredentialProfile, optional): Credentials to use. Defaults to the ones of the .env file.
+        shard (tuple, optional): (shard index, shard count): collect only the templates of this shard.
+        transport (GraphTransport, optional): HTTP transport of the run (e.g. instrumented by a benchmark).
+            Defaults to a new one built from max_connections and http2.
+        metrics_path (str, optional): File where the metrics of the Graph calls are saved at the end of the run
+            (JSON summary if it ends with .json, Prometheus text otherwise).
+        app_fields (list, optional): Fields of the application objects to collect (e.g. ['app_id', 'display_name']).
+            Only these fields are kept when the instantiate response is parsed. Defaults to every field.
+        sp_fields (list, optional): Fields of the service principals to collect. Defaults to every field.
+
+    Returns:
+        int: Number of collected applications (this run and the resumed ones).
+    """
+
+    # the Graph SDK is only imported when a run starts (not for --help or argument errors)
+    from utils.graph_client import GraphClient
+
+    if transport is None:
+        transport = GraphTransport(max_connections=max_connections, max_keepalive_connections=max_connections, http2=http2)
+    client = GraphClient(catalog_cache=TemplateCatalogCache(ttl=catalog_ttl), transport=transport, profile=profile)
+
+    templates = await client.list_application_template(select_fields=TEMPLATE_FIELDS, refresh=refresh_catalog)
     if templates:
         print(f"Successfully retrieved {len(templates)} application templates from Microsoft Entra.\n")
+        if client.catalog_changes:
+            print(f"Template catalog changes since the cached version: {client.catalog_changes}\n")
     else:
         print("No application templates found or failed to retrieve templates.\n")
 
-    instantiated_apps = 0
-    for i, template in enumerate(templates):
-        id = template.get("id")
-        display_name = template.get("display_name")
+    if shard is not None:
+        shard_index, shard_count = shard
+        templates = [template for template in templates if shard_of(template.get("id"), shard_count) == shard_index]
+        print(f"Shard {shard_index + 1}/{shard_count} ({profile.name if profile else client.tenant_id}): {len(templates)} templates.\n")
 
-        try:
-            print(f"Instantiating application from template {i + 1}/{len(templates)}: {id} - {display_name}")
-            # Attempt to instantiate the application from the template
-            app_info = await client.instantiate_application(id, display_name)
-        except Exception as e:
-            print(f"\tSkipping template {id} - {display_name}: error during instantiation\n")
-            continue
-
-        # If the app was succesfully instatiated
-        if app_info:
-            print(f"\tSuccessfully instantiated application from template {id} - {display_name}.")
-            instantiated_apps += 1
+    # metadata fingerprints: an incremental run collects again the templates whose fingerprint changed
+    fingerprints = {template.get("id"): fingerprint(to_serializable(template)) for template in templates}
 
-            application_object = app_info["application"]
-            service_principal = app_info["servicePrincipal"]
+    stats = PipelineStats(0)
+
+    def on_cleanup_done(job, deleted):
+        if not deleted:
+            print(f"\tError while removing {job}")
+            return
+        stats.deleted += 1
+        if job.key is not None:
+            journal.mark_deleted(job.key)
 
-            serialized_application_object = to_serializable(application_object)
-            serialized_service_principal = to_serializable(service_principal)
+    # a batched deletion only waits for its batch: use enough cleanup workers to fill a whole batch
+    cleanup = CleanupEngine(
+        client,
+        batched=batch_cleanup,
+        workers=client.batcher.max_size if batch_cleanup else max(1, workers // 2),
+        on_done=on_cleanup_done,
+    )
+    cleanup.start()
 
-            all_applications.append(serialized_application_object)
-            all_service_principals.append(serialized_service_principal)
+    journal = CollectionJournal(journal_path)
+    # read before the journal is reset: the objects of the previous run are deleted anyway
+    cleanup_leftovers(cleanup, journal, keep_states=resume or incremental)
+    if incremental:
+        # an empty catalog (e.g. a failed download) must not drop the data of the previous runs
+        if templates:
+            added, changed, removed = journal.sync_catalog(templates, fingerprints)
+            print(f"Incremental run: {len(added)} new, {len(changed)} changed and {len(removed)} removed templates since the previous run.\n")
+    elif not resume:
+        journal.reset()
+    journal.register(templates, fingerprints)
 
-            # Delete the instantiated application
+    if writer is None:
+        writer = CollectionWriter()
+    writer.open(journal.collected())
+
+    # templates finished by a previous run are skipped
+    states = journal.states()
+    history = TemplateHistory(history_path)
+    if negative_cache:
+        # failed templates whose negative cache entry expired are probed again
+        for template in templates:
+            if states.get(template.get("id")) == FAILED and not history.is_skipped(template.get("id")):
+                journal.mark_pending(template.get("id"))
+                states[template.get("id")] = PENDING
+
+    pending = [(i, template) for i, template in enumerate(templates) if states.get(template.get("id")) == PENDING]
+    if len(pending) < len(templates):
+        print(f"Skipping {len(templates) - len(pending)} templates already processed by the previous run, {len(pending)} left.\n")
+
+    if negative_cache:
+        pending, skipped = history.schedule(pending)
+        for _, template in skipped:
+            journal.mark_failed(template.get("id"), f"negative cache: {history.error_class(template.get('id'))}")
+        if skipped:
+            print(f"Skipping {len(skipped)} templates that failed recently (negative cache), {len(pending)} left.\n")
+
+    stats.total = len(pending)
+    stats.start_time = time.monotonic()
+
+    # bounded queues between the stages
+    template_queue = asyncio.Queue(maxsize=queue_size)
+    serialize_queue = asyncio.Queue(maxsize=queue_size)
+
+    # templates throttled in the current pass, retried in the next one
+    throttled = []
+
+    async def produce(items):
+        for item in items:
+            await template_queue.put(item)
+        for _ in range(workers):
+            await template_queue.put(None)
+
+    async def instantiate_worker():
+        while True:
+            item = await template_queue.get()
+            if item is None:
+                return
+            i, template = item
+            id = template.get("id")
+            display_name = template.get("display_name")
+
+            start = time.monotonic()
             try:
-                await client.delete_service_principal(service_principal.id)
-                #print(f"Successfully deleted service principal {service_principal.id}\n")
+                if verbose:
+                    print(f"Instantiating application from template {i + 1}/{len(templates)}: {id} - {display_name}")
+                # Attempt to instantiate the application from the template
+                app_info = await client.instantiate_application(
+                    id, f"{name_marker}{display_name}", select_fields_sp=sp_fields, select_fields_app=app_fields, raise_errors=True
+                )
+                error_class, permanent = ("empty result", True) if not app_info else (None, None)
+            except GraphThrottledError:
+                # not a real failure: the template is retried in the next pass
+                stats.throttled += 1
+                throttled.append(item)
+                continue
             except Exception as e:
-                print(f"\tError while removing service principal {service_principal.id}")
+                error_class, permanent = classify_error(e)
+                if verbose:
+                    print(f"\tSkipping template {id} - {display_name}: error during instantiation ({error_class})\n")
+                app_info = None
+            duration = time.monotonic() - start
+
+            stats.processed += 1
+
+            # If the app was succesfully instatiated
+            if app_info:
+                if verbose:
+                    print(f"\tSuccessfully instantiated application from template {id} - {display_name}.")
+                stats.instantiated += 1
+                history.record_success(id, duration)
+                journal.mark_instantiated(id, app_info["servicePrincipal"].id, app_info["application"].id)
+                await serialize_queue.put((id, app_info))
+            else:
+                history.record_failure(id, error_class, permanent, duration)
+                journal.mark_failed(id, error_class)
+
+    async def serialize_stage():
+        while True:
+            item = await serialize_queue.get()
+            if item is None:
+                break
+            template_id, app_info = item
+
+            application_object = app_info["application"]
+            service_principal = app_info["servicePrincipal"]
+
+            application_data = strip_name_marker(to_serializable(application_object), name_marker)
+            service_principal_data = strip_name_marker(to_serializable(service_principal), name_marker)
+
+            # the data is safe on disk before the objects are deleted
+            journal.mark_collected(template_id, application_data, service_principal_data)
+            writer.write(application_data, service_principal_data)
+
+            # Hand the service principal and the application object over to the cleanup engine
+            cleanup.submit(service_principal.id, application_object.id, key=template_id)
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            stats.report()
+
+    reporter = asyncio.create_task(report_progress())
+    try:
+        if sweep_orphans:
+            # before the first instantiation: every object carrying the marker belongs to an earlier run
+            orphans = await try_sweep_orphans(cleanup, name_marker)
+            if orphans:
+                print(f"Cleaning up {orphans} orphaned objects left by earlier runs.\n")
+
+        serializer = asyncio.create_task(serialize_stage())
+
+        for attempt in range(max(1, throttle_passes)):
+            if attempt > 0:
+                print(f"\nRetrying {len(pending)} throttled templates (pass {attempt + 1}/{throttle_passes}).")
+                stats.throttled = 0
+            throttled.clear()
+            await asyncio.gather(produce(pending), *(instantiate_worker() for _ in range(workers)))
+            if not throttled:
+                break
+            pending = sorted(throttled, key=lambda item: item[0])
+
+        # every instantiate worker is done: let the serializer drain and wait for the pending deletions
+        await serialize_queue.put(None)
+        await serializer
+        await cleanup.join()
+        await client.flush()
+    except BaseException:
+        # keep the output files of the previous run: the data collected so far is in the journal
+        writer.abort()
+        journal.close()
+        raise
+    finally:
+        reporter.cancel()
+        history.save()
+        await transport.aclose()
+        await client.credential.close()
+        if metrics_path:
+            client.metrics.save(metrics_path)
+
+    stats.report()
+    token_stats = client.credential.stats()
+    print(
+        f"Token acquisitions: {token_stats['acquisitions']} ({token_stats['background_refreshes']} refreshed in background, "
+        f"avg {token_stats['avg_acquisition_seconds'] * 1000:.0f} ms), requests that waited for a token: {token_stats['waits']}"
+    )
+    print("Graph calls:")
+    client.metrics.report()
+    if metrics_path:
+        print(f"Saved the metrics of the Graph calls to {metrics_path}.")
+
+    # the journal holds the data of this run and of the resumed ones, in template order
+    writer.close(journal.collected())
+    instantiated_apps = journal.collected_count()
+    journal.close()
 
     instantiated_apps_percentage = (instantiated_apps / len(templates)) * 100 if templates else 0
     print(f"\nInstantiated Applications: {instantiated_apps} from {len(templates)} templates ({instantiated_apps_percentage:.2f}%).")
     # OUTPUT: Instantiated Applications: 1860 from 2870 templates (64.81%).
+    if throttled:
+        print(f"Templates not collected because still throttled: {len(throttled)} (run again to collect them).")
+
+    return instantiated_apps
 
-    return all_applications, all_service_principals
 
-async def save_collections():
-    all_applications, all_service_principals = await collect()
+def run_shard(options: dict):
+    """
+    Entry point of a shard process: collect the templates of the shard with its own event loop.
+    """
+    return asyncio.run(collect(**options))
 
-    with open("data/all_applications.json", "w", encoding="utf-8") as app_file:
-        json.dump(all_applications, app_file, indent=2, ensure_ascii=False)
 
-    with open("data/all_service_principals.json", "w", encoding="utf-8") as sp_file:
-        json.dump(all_service_principals, sp_file, indent=2, ensure_ascii=False)
-    
+def shard_path(path: str, name: str):
+    """
+    Return the path of the per-shard copy of a file, e.g. data/collect_journal.<name>.sqlite.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{name}{extension}"
 
-if __name__ == "__main__":
-    asyncio.run(save_collections())
 
+async def collect_sharded(profiles: list, writer: CollectionWriter = None, journal_path: str = "data/collect_journal.sqlite",
+                          catalog_ttl: float = 24 * 3600, refresh_catalog: bool = False, name_marker: str = DEFAULT_NAME_MARKER,
+                          sweep_orphans: bool = True, batch_cleanup: bool = True, **collect_options):
+    """
+    Collect the application templates with several credential profiles (app registrations and/or tenants) at once.
+
+    Graph throttles every app registration and every tenant separately, so the templates are split across the
+    profiles (a stable hash of the template ID, see shard_of()) and each shard runs collect() in its own process,
+    with its own event loop, rate limiter and connection pool: the throughput grows with the number of profiles.
+
+    Every shard has its own journal (e.g. data/collect_journal.<profile>.sqlite), so `resume` and `incremental`
+    work per shard as long as the same profiles are used, and writes its records to data/shards/<profile>/ as they
+    are collected. When all the shards are done, their journals are merged into the usual output files, in
+    catalog order.
+
+    The catalog is downloaded once and the orphans are swept once per tenant before the shards start; the shards then
+    read the catalog from the cache and mark their applications with their own name marker
+    (e.g. '[collect] [2] '), so that they never sweep each other's objects.
+
+    Args:
+        profiles (list of CredentialProfile): One shard per profile.
+        writer (CollectionWriter, optional): Output stage of the merged run. Defaults to the json layout under data/.
+        journal_path (str): Path of the SQLite journal, from which the path of the shard journals is derived.
+        catalog_ttl (float): Seconds a cached template catalog is used without downloading it again.
+        refresh_catalog (bool): If True, download the template catalog even if the cached one is still fresh.
+        name_marker (str): Prefix of the display names of the instantiated applications.
+        sweep_orphans (bool): If True, delete the objects carrying the marker left behind by earlier runs.
+        batch_cleanup (bool): If True, the deletions are sent through Graph JSON batches.
+        **collect_options: Other arguments of collect(), passed to every shard (with `metrics_path`, every shard
+            saves its metrics to its own file, e.g. metrics.<profile>.json).
+
+    Returns:
+        int: Number of collected applications.
+
+    Raises:
+        RuntimeError: If a shard failed (the output files of the previous run are kept).
+    """
+
+    from utils.graph_client import GraphClient
+
+    # one client per tenant: the catalog cache and the orphans are per tenant
+    transport = GraphTransport()
+    clients = {}
+    for profile in profiles:
+        if profile.tenant_id not in clients:
+            clients[profile.tenant_id] = GraphClient(catalog_cache=TemplateCatalogCache(ttl=catalog_ttl), transport=transport, profile=profile)
+
+    try:
+        # the gallery catalog is the same in every tenant: downloaded once, then cached for the other tenants,
+        # whose shards read it from the cache
+        first, *others = clients.values()
+        templates = await first.list_application_template(select_fields=TEMPLATE_FIELDS, refresh=refresh_catalog)
+        for client in others:
+            client.catalog_cache.store(client.tenant_id, TEMPLATE_FIELDS, templates)
+        print(f"Collecting {len(templates)} application templates with {len(profiles)} credential profiles in {len(clients)} tenants.\n")
+
+        if sweep_orphans:
+            for tenant_id, client in clients.items():
+                cleanup = CleanupEngine(client, batched=batch_cleanup)
+                cleanup.start()
+                # the marker of every shard starts with name_marker
+                orphans = await try_sweep_orphans(cleanup, name_marker)
+                await cleanup.join()
+                await client.flush()
+                if orphans:
+                    print(f"Cleaned up {cleanup.deleted} of {orphans} orphaned objects left by earlier runs in tenant {tenant_id}.\n")
+    finally:
+        await transport.aclose()
+        for client in clients.values():
+            await client.credential.close()
+
+    metrics_path = collect_options.pop("metrics_path", None)
+    shards = [
+        dict(
+            collect_options,
+            metrics_path=shard_path(metrics_path, profile.name) if metrics_path else None,
+            profile=profile,
+            shard=(index, len(profiles)),
+            journal_path=shard_path(journal_path, profile.name),
+            writer=CollectionWriter(os.path.join(os.path.dirname(journal_path), "shards", profile.name), format="ndjson"),
+            # the shards read the catalog downloaded above from the cache
+            catalog_ttl=catalog_ttl,
+            refresh_catalog=False,
+            name_marker=f"{name_marker}[{profile.name}] ",
+            sweep_orphans=False,
+            batch_cleanup=batch_cleanup,
+        )
+        for index, profile in enumerate(profiles)
+    ]
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, run_shard, options) for options in shards),
+            return_exceptions=True,
+        )
+
+    failed = [(profile, result) for profile, result in zip(profiles, results) if isinstance(result, BaseException)]
+    for profile, error in failed:
+        print(f"Shard {profile.name} failed: {error!r}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(shards)} shards failed: run again with --resume to complete them")
+
+    # merge the shard journals (each one in catalog order) into the catalog order
+    order = {template.get("id"): i for i, template in enumerate(templates)}
+    journals = [CollectionJournal(options["journal_path"]) for options in shards]
+    try:
+        merged = heapq.merge(
+            *(journal.collected(with_template_ids=True) for journal in journals),
+            key=lambda record: order.get(record[0], len(order)),
+        )
+        collected = ((application, service_principal) for _, application, service_principal in merged)
+
+        if writer is None:
+            writer = CollectionWriter()
+        # the ndjson writer consumes the records on open, the json writer on close
+        writer.open(collected)
+        writer.close(collected)
+        instantiated_apps = sum(journal.collected_count() for journal in journals)
+    finally:
+        for journal in journals:
+            journal.close()
+
+    instantiated_apps_percentage = (instantiated_apps / len(templates)) * 100 if templates else 0
+    print(f"\nInstantiated Applications: {instantiated_apps} from {len(templates)} templates ({instantiated_apps_percentage:.2f}%).")
+
+    return instantiated_apps
 
+
+async def save_collections(output_dir: str = "data", output_format: str = "json", compression: str = None, profiles: list = None,
+                           columnar: str = None, columnar_dir: str = "data/columnar", index_path: str = None, **collect_options):
+    writer = CollectionWriter(output_dir, format=output_format, compression=compression)
+    if profiles and len(profiles) > 1:
+        await collect_sharded(profiles, writer=writer, **collect_options)
+    else:
+        await collect(writer=writer, profile=profiles[0] if profiles else None, **collect_options)
+
+    applications_path, service_principals_path = writer.paths()
+    print(f"Saved {applications_path} and {service_principals_path}.")
+
+    if columnar:
+        # export stage: flattened scopes, roles and resource access as linked columnar tables
+        tables = export_columnar(writer.read(), columnar_dir, format=columnar)
+        for table, (path, rows) in tables.items():
+            print(f"Saved {path} ({rows} rows).")
+
+    if index_path:
+        # index stage: only the applications whose stored data changed since the previous run are rewritten
+        index = AppIndex(index_path)
+        try:
+            counts = index.sync(writer.read())
+        finally:
+            index.close()
+        print(f"Indexed {index_path}: {counts['added']} added, {counts['changed']} changed, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed.")
+
+
+def parse_args(argv: list = None, prog: str = None):
+    parser = argparse.ArgumentParser(prog=prog, description="Collect application and service principal metadata from Microsoft Entra application templates.")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent instantiate workers (default: 8)")
+    parser.add_argument("--queue-size", type=int, default=64, help="maximum number of items waiting between two pipeline stages (default: 64)")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between two progress reports (default: 5)")
+    parser.add_argument("--verbose", action="store_true", help="print a line for every template")
+    parser.add_argument("--throttle-passes", type=int, default=3, help="maximum number of passes over the throttled templates (default: 3)")
+    parser.add_argument("--no-batch-cleanup", action="store_true", help="delete the service principals one request at a time instead of using JSON batches")
+    parser.add_argument("--resume", action="store_true", help="continue the interrupted run recorded in the journal, skipping the finished templates")
+    parser.add_argument("--incremental", action="store_true", help="only collect the templates that are new or changed since the previous run and merge them with its data")
+    parser.add_argument("--no-negative-cache", action="store_true", help="instantiate also the templates that failed recently")
+    parser.add_argument("--history", default="data/cache/template_history.json", help="path of the template history used by the negative cache (default: data/cache/template_history.json)")
+    parser.add_argument("--name-marker", default=DEFAULT_NAME_MARKER, help=f"prefix of the display names of the instantiated applications (default: '{DEFAULT_NAME_MARKER}')")
+    parser.add_argument("--no-sweep", action="store_true", help="do not delete the objects carrying the name marker left behind by earlier runs")
+    parser.add_argument("--profiles", default=None, help="JSON file of the credential profiles: with several profiles the templates are split across them, one process per profile (default: the profiles of the .env file)")
+    parser.add_argument("--max-connections", type=int, default=100, help="size of the HTTP connection pool (default: 100)")
+    parser.add_argument("--no-http2", action="store_true", help="use HTTP/1.1 even if HTTP/2 is available")
+    parser.add_argument("--metrics", default=None, help="save the metrics of the Graph calls to this file: JSON summary if it ends with .json, Prometheus text otherwise")
+    parser.add_argument("--app-fields", type=lambda value: value.split(","), default=None, help="comma-separated fields of the application objects to collect, e.g. app_id,display_name,required_resource_access (default: all)")
+    parser.add_argument("--sp-fields", type=lambda value: value.split(","), default=None, help="comma-separated fields of the service principals to collect (default: all)")
+    parser.add_argument("--journal", default="data/collect_journal.sqlite", help="path of the SQLite journal of the run (default: data/collect_journal.sqlite)")
+    parser.add_argument("--catalog-ttl", type=float, default=24 * 3600, help="seconds a cached template catalog is used without downloading it again (default: 86400)")
+    parser.add_argument("--refresh-catalog", action="store_true", help="download the template catalog even if the cached one is still fresh")
+    parser.add_argument("--output-dir", default="data", help="directory of the output files (default: data)")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json", help="json: today's all_*.json layout, ndjson: one record per line written as collected (default: json)")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None, help="compress the ndjson output (zstd requires the zstandard package)")
+    parser.add_argument("--columnar", choices=["parquet", "arrow"], default=None, help="also export the collected data as linked columnar tables (requires the pyarrow package)")
+    parser.add_argument("--columnar-dir", default="data/columnar", help="directory of the columnar tables (default: data/columnar)")
+    parser.add_argument("--index", default=None, help="also update the query index of the collected applications at this path, e.g. data/app_index.sqlite (see query_index.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None, prog: str = None):
+    args = parse_args(argv, prog)
+    asyncio.run(save_collections(
+        workers=args.workers,
+        queue_size=args.queue_size,
+        progress_interval=args.progress_interval,
+        verbose=args.verbose,
+        throttle_passes=args.throttle_passes,
+        batch_cleanup=not args.no_batch_cleanup,
+        resume=args.resume,
+        incremental=args.incremental,
+        negative_cache=not args.no_negative_cache,
+        history_path=args.history,
+        name_marker=args.name_marker,
+        sweep_orphans=not args.no_sweep,
+        max_connections=args.max_connections,
+        http2=not args.no_http2,
+        journal_path=args.journal,
+        metrics_path=args.metrics,
+        app_fields=args.app_fields,
+        sp_fields=args.sp_fields,
+        output_dir=args.output_dir,
+        output_format=args.format,
+        compression=args.compression,
+        columnar=args.columnar,
+        columnar_dir=args.columnar_dir,
+        index_path=args.index,
+        catalog_ttl=args.catalog_ttl,
+        refresh_catalog=args.refresh_catalog,
+        profiles=load_profiles(args.profiles),
+    ))
+
+
+if __name__ == "__main__":
+    main()
     print("\nEnd of Script.")
 
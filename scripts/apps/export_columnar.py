@@ -0,0 +1,44 @@
+import sys
+import os
+import argparse
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.columnar import export_columnar
+from utils.writer import CollectionWriter
+
+
+def export(input_dir: str = "data", input_format: str = "json", compression: str = None, output_dir: str = "data/columnar",
+           format: str = "parquet", columnar_compression: str = None):
+    """
+    Export the output files of a collection run (all_applications / all_service_principals) to linked columnar tables.
+    """
+    collection = CollectionWriter(input_dir, format=input_format, compression=compression)
+    tables = export_columnar(collection.read(), output_dir, format=format, compression=columnar_compression)
+    for table, (path, rows) in tables.items():
+        print(f"Saved {path} ({rows} rows).")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the collected applications and service principals to Parquet or Arrow tables.")
+    parser.add_argument("--input-dir", default="data", help="directory of the output files of collect.py (default: data)")
+    parser.add_argument("--input-format", choices=["json", "ndjson"], default="json", help="format of the output files of collect.py (default: json)")
+    parser.add_argument("--input-compression", choices=["gzip", "zstd"], default=None, help="compression of the ndjson output files of collect.py")
+    parser.add_argument("--output-dir", default="data/columnar", help="directory of the columnar tables (default: data/columnar)")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet", help="parquet, or arrow for memory-mappable Arrow IPC files (default: parquet)")
+    parser.add_argument("--compression", default=None, help="compression codec of the tables (default: zstd for parquet, none for arrow)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    export(
+        input_dir=args.input_dir,
+        input_format=args.input_format,
+        compression=args.input_compression,
+        output_dir=args.output_dir,
+        format=args.format,
+        columnar_compression=args.compression,
+    )
+    print("\nEnd of Script.")
@@ -0,0 +1,117 @@
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.app_index import AppIndex, DOMAIN, MICROSOFT_GRAPH_APP_ID, RESOURCE, ROLE, SCOPE, TAG
+from utils.writer import CollectionWriter
+
+
+def build(index: AppIndex, input_dir: str = "data", input_format: str = "json", compression: str = None, prune: bool = True):
+    """
+    Update the index with the output files of a collection run (all_applications / all_service_principals).
+    """
+    collection = CollectionWriter(input_dir, format=input_format, compression=compression)
+    counts = index.sync(collection.read(), prune=prune)
+    print(f"Indexed {index.path}: {counts['added']} added, {counts['changed']} changed, "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed.")
+
+
+async def fetch_permissions(index: AppIndex, resource_app_ids: list):
+    """
+    Save the permission names of the resource APIs (delegated scopes and app roles of their service principals),
+    so that the requested permissions can be queried by name.
+    """
+    from utils.graph_client import GraphClient
+    from utils.serializer import to_serializable
+
+    client = GraphClient()
+    try:
+        for resource_app_id in resource_app_ids:
+            async for service_principal in client.iter_service_principals(
+                select=["app_id", "oauth2_permission_scopes", "app_roles"],
+                filter=f"appId eq '{resource_app_id}'",
+            ):
+                saved = index.add_resource(to_serializable(service_principal))
+                print(f"Saved {saved} permissions of {resource_app_id}.")
+    finally:
+        try:
+            await client.credential.close()
+        finally:
+            await client.transport.aclose()
+
+
+def print_results(results: list, elapsed: float, as_json: bool = False):
+    if as_json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    for result in results:
+        print(f"{result['display_name']}\t{result['key']}\t{result['app_id']}")
+    print(f"\n{len(results)} applications ({elapsed * 1000:.2f} ms).")
+
+
+def parse_args(argv: list = None, prog: str = None):
+    parser = argparse.ArgumentParser(prog=prog, description="Query the index of the collected applications.")
+    parser.add_argument("--index", default="data/app_index.sqlite", help="path of the SQLite index (default: data/app_index.sqlite)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="add the output files of a collection run to the index")
+    build_parser.add_argument("--input-dir", default="data", help="directory of the output files of collect.py (default: data)")
+    build_parser.add_argument("--input-format", choices=["json", "ndjson"], default="json", help="format of the output files of collect.py (default: json)")
+    build_parser.add_argument("--input-compression", choices=["gzip", "zstd"], default=None, help="compression of the ndjson output files of collect.py")
+    build_parser.add_argument("--no-prune", action="store_true", help="keep the indexed applications missing from the output files (e.g. partial runs)")
+
+    fetch_parser = commands.add_parser("fetch-permissions", help="download the permission names of resource APIs from Graph")
+    fetch_parser.add_argument("resource_app_ids", nargs="*", default=[MICROSOFT_GRAPH_APP_ID], help="appIds of the resource APIs (default: Microsoft Graph)")
+
+    requests_parser = commands.add_parser("requests", help="applications requesting a permission (name, e.g. Mail.ReadWrite, or ID)")
+    requests_parser.add_argument("permission")
+    requests_parser.add_argument("--resource", default=None, help="appId of the resource API of the permission, e.g. " + MICROSOFT_GRAPH_APP_ID)
+    requests_parser.add_argument("--type", choices=["Scope", "Role"], default=None, help="Scope (delegated) or Role (application) permissions only")
+
+    for command, description in [
+        (SCOPE, "service principals exposing a delegated permission scope"),
+        (ROLE, "service principals exposing an app role"),
+        (TAG, "applications with a tag"),
+        (DOMAIN, "applications with a reply URL in a domain or its subdomains"),
+        (RESOURCE, "applications requesting permissions of a resource API (appId)"),
+        ("search", "applications whose display name contains the text"),
+    ]:
+        commands.add_parser(command, help=description).add_argument("value")
+
+    commands.add_parser("stats", help="number of indexed applications, terms and permission names")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None, prog: str = None):
+    args = parse_args(argv, prog)
+    index = AppIndex(args.index)
+    try:
+        if args.command == "build":
+            build(index, args.input_dir, args.input_format, args.input_compression, prune=not args.no_prune)
+        elif args.command == "fetch-permissions":
+            asyncio.run(fetch_permissions(index, args.resource_app_ids))
+        elif args.command == "stats":
+            print(json.dumps(index.stats(), indent=2))
+        else:
+            start = time.perf_counter()
+            if args.command == "requests":
+                results = index.requesting(args.permission, resource_app_id=args.resource, permission_type=args.type)
+            elif args.command == "search":
+                results = index.search(args.value)
+            else:
+                results = index.find(args.command, args.value)
+            print_results(results, time.perf_counter() - start, as_json=args.json)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
+    print("\nEnd of Script.")
@@ -0,0 +1,148 @@
+import sys
+import os
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+import urllib.request
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'apps')))
+
+from mock_graph import MockGraphServer, add_mock_arguments, mock_from_args
+from utils.transport import GraphTransport
+from utils.writer import CollectionWriter
+
+
+class LatencyRecorder:
+    """
+    httpx event hooks measuring the latency (time to the response headers) of every request of the client.
+    """
+
+    def __init__(self):
+        self.started = {}
+        self.latencies = []
+
+    async def on_request(self, request):
+        self.started[id(request)] = time.perf_counter()
+
+    async def on_response(self, response):
+        start = self.started.pop(id(response.request), None)
+        if start is not None:
+            self.latencies.append(time.perf_counter() - start)
+
+    def event_hooks(self):
+        return {"request": [self.on_request], "response": [self.on_response]}
+
+    def percentile(self, p: float):
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+
+def serve(args, connection):
+    """
+    Run the mock server in its own process, so that it does not share the CPU time and the memory of the client.
+    """
+    server = MockGraphServer(mock_from_args(args))
+    connection.send(server.url)
+    server.httpd.serve_forever()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(args):
+    parent_connection, child_connection = multiprocessing.Pipe()
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(args, child_connection), daemon=True)
+    server.start()
+    url = parent_connection.recv()
+
+    # GraphClient calls the mock server without tokens: the credentials only have to be well formed
+    os.environ["GRAPH_BASE_URL"] = url
+    os.environ.setdefault("TENANT_ID", "00000000-0000-0000-0000-000000000000")
+    os.environ.setdefault("CLIENT_ID", "00000000-0000-0000-0000-000000000000")
+    os.environ.setdefault("CLIENT_SECRET", "benchmark")
+
+    from collect import collect
+
+    recorder = LatencyRecorder()
+    transport = GraphTransport(
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+        http2=False,
+        event_hooks=recorder.event_hooks(),
+    )
+
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            # journal, history, catalog cache and output files of the run stay in the temporary directory
+            os.chdir(directory)
+            start = time.perf_counter()
+            collected = asyncio.run(collect(
+                workers=args.workers,
+                progress_interval=3600,
+                batch_cleanup=not args.no_batch_cleanup,
+                writer=CollectionWriter(format=args.format),
+                transport=transport,
+            ))
+            elapsed = time.perf_counter() - start
+
+        with urllib.request.urlopen(url.rsplit("/", 1)[0] + "/_stats") as response:
+            server_stats = json.loads(response.read())
+    finally:
+        os.chdir(cwd)
+        server.terminate()
+        server.join()
+
+    return {
+        "templates": args.templates,
+        "collected": collected,
+        "elapsed_seconds": elapsed,
+        "templates_per_second": args.templates / elapsed if elapsed else 0.0,
+        "client_requests": len(recorder.latencies),
+        "latency_p50": recorder.percentile(0.50),
+        "latency_p99": recorder.percentile(0.99),
+        "peak_rss_mb": peak_rss_mb(),
+        "server": server_stats,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark collect() end to end against the local mock Graph server.")
+    add_mock_arguments(parser)
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent instantiate workers (default: 8)")
+    parser.add_argument("--max-connections", type=int, default=100, help="size of the HTTP connection pool (default: 100)")
+    parser.add_argument("--no-batch-cleanup", action="store_true", help="delete the objects one request at a time instead of using JSON batches")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json", help="output format of the run (default: json)")
+    parser.add_argument("--report", default=None, help="also write the results to this JSON file, e.g. to compare two versions")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.report:
+        args.report = os.path.abspath(args.report)
+    results = run(args)
+
+    print(f"\nTemplates: {results['templates']}, collected: {results['collected']}, "
+          f"elapsed: {results['elapsed_seconds']:.2f} s ({results['templates_per_second']:.2f} templates/sec)")
+    print(f"Client requests: {results['client_requests']}, latency p50: {results['latency_p50'] * 1000:.1f} ms, "
+          f"p99: {results['latency_p99'] * 1000:.1f} ms")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print(f"Server: {results['server']['http_requests']} HTTP requests, {results['server']['batches']} batches, "
+          f"statuses {results['server']['statuses']}")
+    for route, count in sorted(results["server"]["requests"].items()):
+        print(f"\t{route}: {count}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=2)
+        print(f"Saved {args.report}.")
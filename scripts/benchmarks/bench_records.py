@@ -0,0 +1,105 @@
+import sys
+import os
+import argparse
+import json
+import time
+import tracemalloc
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from bench_serializer import make_corpus, make_responses, sdk_parser
+from utils.records import to_record
+from utils.serializer import ModelSerializer, model_schema
+
+
+# Projection of a typical permissions sweep
+APP_FIELDS = ["app_id", "display_name", "required_resource_access"]
+SP_FIELDS = ["app_id", "display_name", "app_roles", "oauth2_permission_scopes", "reply_urls", "tags"]
+
+
+def measure(build, responses: list, memory_sample: int):
+    """
+    Time `build` on every response, then measure its memory on the first `memory_sample` responses (tracemalloc
+    slows down the SDK parsing by orders of magnitude, so its timings are taken without it).
+
+    Returns:
+        tuple: (objects built from every response, seconds, bytes per app still allocated by the objects,
+            peak bytes per app while building).
+    """
+    start = time.perf_counter()
+    objects = build(responses)
+    elapsed = time.perf_counter() - start
+
+    sample = responses[:memory_sample]
+    tracemalloc.start()
+    kept = build(sample)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return objects, elapsed, current / len(sample), peak / len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and time of the objects kept per instantiated app: SDK models against slotted records.")
+    parser.add_argument("--size", type=int, default=1860, help="number of (application, service principal) pairs (default: 1860)")
+    parser.add_argument("--memory-sample", type=int, default=50, help="number of pairs whose memory is measured (default: 50)")
+    args = parser.parse_args()
+
+    responses = make_responses(make_corpus(args.size))
+    parse_models = sdk_parser()
+    if parse_models is not None:
+        # the msgraph models, parsed from the same JSON as the records
+        def build_models(contents):
+            return [parse_models(content) for content in contents]
+        models_label = "msgraph models"
+    else:
+        # the dataclass stand-ins of bench_serializer.py: built without JSON parsing, so their time is a lower bound
+        def build_models(contents):
+            return make_corpus(len(contents))
+        models_label = "models*"
+    application, service_principal = build_models(responses[:1])[0]
+    application_schema = model_schema(type(application))
+    service_principal_schema = model_schema(type(service_principal))
+
+    def parse(contents, select_app: list = None, select_sp: list = None):
+        pairs = []
+        for content in contents:
+            result = json.loads(content)
+            pairs.append((
+                to_record(result["application"], "Application", select_app, schema=application_schema),
+                to_record(result["servicePrincipal"], "ServicePrincipal", select_sp, schema=service_principal_schema),
+            ))
+        return pairs
+
+    def parse_json(contents):
+        return [json.loads(content) for content in contents]
+
+    corpus, models_time, models_bytes, models_peak = measure(build_models, responses, args.memory_sample)
+    _, json_time, json_bytes, json_peak = measure(parse_json, responses, args.memory_sample)
+    full, full_time, full_bytes, full_peak = measure(parse, responses, args.memory_sample)
+    _, projected_time, projected_bytes, projected_peak = measure(lambda contents: parse(contents, APP_FIELDS, SP_FIELDS), responses, args.memory_sample)
+
+    # whole-object records write the same output as the models
+    serializer = ModelSerializer()
+    assert all(serializer(record) == serializer(model) for pair, models in zip(full, corpus) for record, model in zip(pair, models))
+
+    print(f"Corpus: {args.size} applications + {args.size} service principals ({sum(map(len, responses)) / 1024:.0f} KiB of JSON), "
+          f"memory measured on {min(args.memory_sample, args.size)} pairs")
+    for label, elapsed, kept, peak in [
+        (models_label, models_time, models_bytes, models_peak),
+        ("parsed JSON (dicts)", json_time, json_bytes, json_peak),
+        ("records (all fields)", full_time, full_bytes, full_peak),
+        ("records (projected)", projected_time, projected_bytes, projected_peak),
+    ]:
+        print(f"{label:22}: {elapsed * 1000:8.1f} ms, {kept:8.0f} bytes/app kept, peak {peak:8.0f} bytes/app")
+    print(f"Projected records keep {projected_bytes / models_bytes:.1%} of the memory of the models, "
+          f"whole-object records {full_bytes / models_bytes:.1%}")
+    if parse_models is None:
+        print("* msgraph SDK not installed: construction only of the stand-ins, without JSON parsing; "
+              "the records timings include json.loads (see 'parsed JSON')")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import sys
+import os
+import argparse
+import datetime
+import enum
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.records import to_record
+from utils.serializer import ModelSerializer, model_schema
+
+
+# Serializer used by collect.py before utils/serializer.py, kept here as the baseline
+def legacy_to_serializable(obj):
+    """
+    Try to convert an object to a dictionary recursively,
+    skipping non-serializable attributes.
+    """
+    if isinstance(obj, list):
+        return [legacy_to_serializable(item) for item in obj]
+    elif hasattr(obj, "__dict__"):
+        return {key: legacy_to_serializable(value) for key, value in vars(obj).items() if not key.startswith("_")}
+    elif isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    else:
+        return str(obj)  # fallback to string
+
+
+# Stand-ins with the same shape as the msgraph models (dataclasses with an in-memory backing store): they generate
+# the corpus, which is parsed into the msgraph models when the SDK is installed (see load_corpus)
+
+class BackingStore:
+    def __init__(self):
+        self.store = {}
+        self.initialization_completed = True
+        self.return_only_changed_values = False
+
+
+class PermissionScopeType(str, enum.Enum):
+    User = "User"
+    Admin = "Admin"
+
+
+@dataclass
+class Model:
+    backing_store: BackingStore = field(default_factory=BackingStore, repr=False)
+    additional_data: Dict[str, Any] = field(default_factory=dict)
+    odata_type: Optional[str] = None
+
+
+@dataclass
+class AppRole(Model):
+    allowed_member_types: List[str] = None
+    description: Optional[str] = None
+    display_name: Optional[str] = None
+    id: Optional[uuid.UUID] = None
+    is_enabled: Optional[bool] = None
+    origin: Optional[str] = None
+    value: Optional[str] = None
+
+
+@dataclass
+class PermissionScope(Model):
+    admin_consent_description: Optional[str] = None
+    admin_consent_display_name: Optional[str] = None
+    id: Optional[uuid.UUID] = None
+    is_enabled: Optional[bool] = None
+    type: Optional[PermissionScopeType] = None
+    user_consent_description: Optional[str] = None
+    user_consent_display_name: Optional[str] = None
+    value: Optional[str] = None
+
+
+@dataclass
+class ResourceAccess(Model):
+    id: Optional[uuid.UUID] = None
+    type: Optional[str] = None
+
+
+@dataclass
+class RequiredResourceAccess(Model):
+    resource_access: List[ResourceAccess] = None
+    resource_app_id: Optional[str] = None
+
+
+@dataclass
+class WebApplication(Model):
+    home_page_url: Optional[str] = None
+    logout_url: Optional[str] = None
+    redirect_uris: List[str] = None
+
+
+@dataclass
+class Application(Model):
+    odata_type: Optional[str] = "#microsoft.graph.application"
+    id: Optional[str] = None
+    app_id: Optional[str] = None
+    display_name: Optional[str] = None
+    created_date_time: Optional[datetime.datetime] = None
+    sign_in_audience: Optional[str] = None
+    publisher_domain: Optional[str] = None
+    tags: List[str] = None
+    identifier_uris: List[str] = None
+    app_roles: List[AppRole] = None
+    required_resource_access: List[RequiredResourceAccess] = None
+    web: Optional[WebApplication] = None
+
+
+@dataclass
+class ServicePrincipal(Model):
+    odata_type: Optional[str] = "#microsoft.graph.servicePrincipal"
+    id: Optional[str] = None
+    app_id: Optional[str] = None
+    display_name: Optional[str] = None
+    account_enabled: Optional[bool] = None
+    service_principal_type: Optional[str] = None
+    homepage: Optional[str] = None
+    reply_urls: List[str] = None
+    tags: List[str] = None
+    app_roles: List[AppRole] = None
+    oauth2_permission_scopes: List[PermissionScope] = None
+
+
+def make_corpus(size: int, seed: int = 0):
+    """
+    Build `size` (application, service principal) pairs shaped like the objects returned by /instantiate.
+    """
+    rng = random.Random(seed)
+
+    def app_roles():
+        return [
+            AppRole(allowed_member_types=["User"], description=f"Role {i}", display_name=f"Role {i}",
+                    id=uuid.UUID(int=rng.getrandbits(128)), is_enabled=True, origin="Application", value=f"role.{i}")
+            for i in range(rng.randint(0, 6))
+        ]
+
+    corpus = []
+    for n in range(size):
+        app_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        name = f"Gallery App {n}"
+        reply_urls = [f"https://app{n}.example.com/callback/{i}" for i in range(rng.randint(1, 4))]
+        application = Application(
+            id=str(uuid.UUID(int=rng.getrandbits(128))), app_id=app_id, display_name=name,
+            created_date_time=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=n),
+            sign_in_audience="AzureADMyOrg", publisher_domain="example.onmicrosoft.com",
+            tags=["WindowsAzureActiveDirectoryIntegratedApp"], identifier_uris=[f"https://app{n}.example.com"],
+            app_roles=app_roles(),
+            required_resource_access=[
+                RequiredResourceAccess(
+                    resource_app_id="00000003-0000-0000-c000-000000000000",
+                    resource_access=[ResourceAccess(id=uuid.UUID(int=rng.getrandbits(128)), type="Scope") for _ in range(rng.randint(1, 5))],
+                )
+            ],
+            web=WebApplication(home_page_url=f"https://app{n}.example.com", redirect_uris=reply_urls),
+        )
+        service_principal = ServicePrincipal(
+            id=str(uuid.UUID(int=rng.getrandbits(128))), app_id=app_id, display_name=name, account_enabled=True,
+            service_principal_type="Application", homepage=f"https://app{n}.example.com", reply_urls=reply_urls,
+            tags=["WindowsAzureActiveDirectoryIntegratedApp"], app_roles=app_roles(),
+            oauth2_permission_scopes=[
+                PermissionScope(admin_consent_description=f"Access {name}", admin_consent_display_name=f"Access {name}",
+                                id=uuid.UUID(int=rng.getrandbits(128)), is_enabled=True, type=PermissionScopeType.User,
+                                user_consent_description=f"Access {name}", user_consent_display_name=f"Access {name}",
+                                value="user_impersonation")
+                for _ in range(rng.randint(0, 3))
+            ],
+        )
+        corpus.append((application, service_principal))
+    return corpus
+
+
+def graph_json(value):
+    """
+    Convert a serialized model back to the JSON sent by Graph: camelCase keys, '@odata.type', no additional data.
+    """
+    if isinstance(value, list):
+        return [graph_json(item) for item in value]
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key == "additional_data":
+                continue
+            head, *tail = key.split("_")
+            name = "@odata.type" if key == "odata_type" else head + "".join(part[:1].upper() + part[1:] for part in tail)
+            result[name] = graph_json(item)
+        return result
+    return value
+
+
+def make_responses(corpus: list):
+    """
+    Build the raw /instantiate responses (JSON bytes) of the (application, service principal) pairs of a corpus.
+    """
+    serializer = ModelSerializer()
+    return [
+        json.dumps({"application": graph_json(serializer(application)), "servicePrincipal": graph_json(serializer(service_principal))}).encode("utf-8")
+        for application, service_principal in corpus
+    ]
+
+
+def sdk_parser():
+    """
+    Return a function parsing an /instantiate response (JSON bytes) into the msgraph models, as the SDK does,
+    or None if the msgraph SDK is not installed.
+    """
+    try:
+        from kiota_serialization_json.json_parse_node_factory import JsonParseNodeFactory
+        from msgraph.generated.models.application import Application as GraphApplication
+        from msgraph.generated.models.service_principal import ServicePrincipal as GraphServicePrincipal
+    except ImportError:
+        return None
+    factory = JsonParseNodeFactory()
+
+    def parse(content: bytes):
+        node = factory.get_root_parse_node("application/json", content)
+        return (
+            node.get_child_node("application").get_object_value(GraphApplication),
+            node.get_child_node("servicePrincipal").get_object_value(GraphServicePrincipal),
+        )
+
+    return parse
+
+
+def load_corpus(size: int, seed: int = 0):
+    """
+    Build the corpus of the benchmarks: msgraph models parsed from the JSON of the generated apps when the SDK
+    is installed, the stand-ins otherwise.
+
+    Returns:
+        tuple: (list of (application, service principal) pairs, description of the models).
+    """
+    corpus = make_corpus(size, seed)
+    parse = sdk_parser()
+    if parse is None:
+        return corpus, "dataclass stand-ins (msgraph SDK not installed)"
+    return [parse(content) for content in make_responses(corpus)], "msgraph models parsed from JSON"
+
+
+def make_records(corpus: list):
+    """
+    Build the records of the corpus from its JSON, as instantiate_application() does (whole objects, model layout).
+    """
+    serializer = ModelSerializer()
+    return [
+        (
+            to_record(graph_json(serializer(application)), "Application", schema=model_schema(type(application))),
+            to_record(graph_json(serializer(service_principal)), "ServicePrincipal", schema=model_schema(type(service_principal))),
+        )
+        for application, service_principal in corpus
+    ]
+
+
+def bench(function, corpus, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for application, service_principal in corpus:
+            function(application)
+            function(service_principal)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the serializer of collect.py against the previous reflective one.")
+    parser.add_argument("--size", type=int, default=1860, help="number of (application, service principal) pairs (default: 1860)")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best one is reported (default: 5)")
+    args = parser.parse_args()
+
+    corpus, models = load_corpus(args.size)
+    records = make_records(corpus)
+    serializer = ModelSerializer()
+
+    legacy = bench(legacy_to_serializable, corpus, args.repeat)
+    current = bench(serializer, corpus, args.repeat)
+    current_records = bench(serializer, records, args.repeat)
+
+    # size of the output, as written by the writer
+    legacy_bytes = sum(len(json.dumps(legacy_to_serializable(obj))) for pair in corpus for obj in pair)
+    current_bytes = sum(len(json.dumps(serializer(obj))) for pair in corpus for obj in pair)
+    records_bytes = sum(len(json.dumps(serializer(obj))) for pair in records for obj in pair)
+
+    objects = 2 * len(corpus)
+    print(f"Corpus: {len(corpus)} applications + {len(corpus)} service principals, {models}")
+    print(f"legacy to_serializable:     {legacy * 1000:.1f} ms ({objects / legacy:.0f} objects/sec), {legacy_bytes / 1024:.0f} KiB of JSON")
+    print(f"ModelSerializer:            {current * 1000:.1f} ms ({objects / current:.0f} objects/sec), {current_bytes / 1024:.0f} KiB of JSON")
+    print(f"ModelSerializer (records):  {current_records * 1000:.1f} ms ({objects / current_records:.0f} objects/sec), {records_bytes / 1024:.0f} KiB of JSON")
+    print(f"Speed-up: {legacy / current:.2f}x (models), {legacy / current_records:.2f}x (records, as written by collect.py)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.catalog_cache import TemplateCatalogCache
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CLI = os.path.join(ROOT, "scripts", "cli.py")
+
+# Top-level packages of the Graph SDK and of its dependencies
+HEAVY_PACKAGES = ("msgraph", "msgraph_core", "kiota_abstractions", "kiota_http", "azure", "httpx")
+
+
+def scenarios(directory: str):
+    """
+    Commands to time: (label, argv). The previous entry points load the Graph SDK at import time.
+    """
+    index = os.path.join(directory, "app_index.sqlite")
+    cache_dir = os.path.join(directory, "cache")
+    return [
+        ("import utils.graph_client (old entry points)", ["-c", "import utils.graph_client"]),
+        ("collect.py --help", [os.path.join(ROOT, "scripts", "apps", "collect.py"), "--help"]),
+        ("cli.py --help", [CLI, "--help"]),
+        ("cli.py query stats", [CLI, "query", "--index", index, "stats"]),
+        ("cli.py query requests Mail.Read", [CLI, "query", "--index", index, "requests", "Mail.Read"]),
+        ("cli.py templates (catalog cache)", [CLI, "templates", "--cache-dir", cache_dir]),
+        ("cli.py collect --help", [CLI, "collect", "--help"]),
+    ]
+
+
+def run(argv: list, env: dict, repeat: int):
+    """
+    Run a command `repeat` times.
+
+    Returns:
+        dict: Median wall time, import time and heavy packages loaded (from -X importtime), or the error.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *argv], cwd=ROOT, env=env, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {"error": (result.stderr.strip().splitlines() or ["exit code %d" % result.returncode])[-1]}
+
+    # one more run with -X importtime: self time of every imported module, in microseconds
+    result = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=ROOT, env=env, capture_output=True, text=True)
+    import_time = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        import_time += int(self_time)
+        modules.add(name.strip().split(".")[0])
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "import_ms": import_time / 1000,
+        "heavy_packages": sorted(modules.intersection(HEAVY_PACKAGES)),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Startup time and imports of the entry points (old scripts against cli.py).")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every command, the median is reported (default: 5)")
+    parser.add_argument("--report", default=None, help="also write the results to this JSON file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # credentials only name the tenant of the cached catalog: no request is sent
+        env = dict(os.environ, TENANT_ID="00000000-0000-0000-0000-000000000000", CLIENT_ID="00000000-0000-0000-0000-000000000000", CLIENT_SECRET="benchmark")
+        TemplateCatalogCache(os.path.join(directory, "cache")).store(
+            env["TENANT_ID"], ["id", "display_name"], [{"id": str(i), "display_name": f"Template {i}"} for i in range(3000)]
+        )
+
+        results = {}
+        for label, argv in scenarios(directory):
+            results[label] = run(argv, env, args.repeat)
+            result = results[label]
+            if "error" in result:
+                print(f"{label:45}: failed ({result['error']})")
+            else:
+                print(f"{label:45}: {result['median_ms']:7.1f} ms, imports {result['import_ms']:7.1f} ms, "
+                      f"Graph SDK: {', '.join(result['heavy_packages']) or 'not loaded'}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=2)
+        print(f"Saved {args.report}.")
+
+    print("\nEnd of Script.")
@@ -0,0 +1,436 @@
+import sys
+import os
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.batch import MAX_BATCH_SIZE
+
+
+API_VERSION = "/v1.0"
+
+# $filter expressions used by GraphClient
+STARTSWITH_FILTER = re.compile(r"^startswith\((\w+),\s*'((?:[^']|'')*)'\)$")
+EQUALS_FILTER = re.compile(r"^(\w+) eq '((?:[^']|'')*)'$")
+
+
+def graph_error(status: int, code: str, message: str, headers: dict = None):
+    return status, headers or {}, {"error": {"code": code, "message": message}}
+
+
+class MockGraph:
+    """
+    In-memory stand-in of the Microsoft Graph endpoints used by GraphClient and collect():
+
+    - GET /applicationTemplates (paging with $top and @odata.nextLink, $select)
+    - POST /applicationTemplates/{id}/instantiate
+    - GET /servicePrincipals, GET and DELETE /servicePrincipals/{id}
+    - GET /applications, GET and DELETE /applications/{id}
+    - GET /oauth2PermissionGrants, GET /users
+    - POST /$batch (up to 20 requests, throttled one by one)
+
+    Latency, transient errors and throttling (429 with Retry-After, random or over a requests/sec budget) are
+    configurable, so that the performance of the client can be measured without a live tenant. A fraction of the
+    templates cannot be instantiated (400), as in the real gallery.
+    """
+
+    def __init__(self, templates: int = 3000, latency: float = 0.02, instantiate_latency: float = 0.3, jitter: float = 0.5,
+                 error_rate: float = 0.0, invalid_rate: float = 0.35, throttle_rate: float = 0.0, max_rps: float = None,
+                 retry_after: float = 1.0, seed: int = 0):
+        """
+        Args:
+            templates (int): Number of application templates of the gallery.
+            latency (float): Base latency of every request, in seconds.
+            instantiate_latency (float): Base latency of an instantiation, in seconds.
+            jitter (float): Random variation of the latencies, as a fraction of the base latency.
+            error_rate (float): Probability that a request fails with a transient 500 error.
+            invalid_rate (float): Fraction of the templates that cannot be instantiated (400).
+            throttle_rate (float): Probability that a request is throttled (429).
+            max_rps (float, optional): Requests per second accepted before throttling (batched requests count one by one).
+            retry_after (float): Retry-After of the throttled requests, in seconds.
+            seed (int): Seed of the random generator (catalog and failures).
+        """
+        self.latency = latency
+        self.instantiate_latency = instantiate_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.templates = [self._template(i, seed) for i in range(templates)]
+        self.template_index = {template["id"]: template for template in self.templates}
+        self.invalid_templates = {template["id"] for template in self.templates if self.random.random() < invalid_rate}
+        self.service_principals = {}
+        self.applications = {}
+        self.users = [
+            {"id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"user-{i}")), "displayName": f"User {i}", "userPrincipalName": f"user{i}@contoso.test"}
+            for i in range(25)
+        ]
+
+        # requests/sec budget (token bucket)
+        self.tokens = max_rps or 0.0
+        self.last_refill = time.monotonic()
+
+        # counters
+        self.requests = Counter()           # "METHOD /route" -> requests (batched requests included)
+        self.statuses = Counter()           # status code -> responses
+        self.batches = 0
+        self.latencies = []                 # seconds spent serving every HTTP request
+
+    @staticmethod
+    def _template(i: int, seed: int):
+        name = f"Mock App {i:04d}"
+        return {
+            "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"template-{seed}-{i}")),
+            "displayName": name,
+            "description": f"{name} is a stand-in application template used for benchmarks.",
+            "publisher": f"Publisher {i % 97}",
+            "categories": ["collaboration", "productivity", "security", "developerServices"][i % 4:i % 4 + 1],
+            "homePageUrl": f"https://app{i}.example.com",
+            "logoUrl": f"https://app{i}.example.com/logo.png",
+            "supportedProvisioningTypes": ["sync"] if i % 5 == 0 else [],
+            "supportedSingleSignOnModes": ["saml", "password"] if i % 2 else ["oidc"],
+        }
+
+    def delay(self, instantiate: bool = False):
+        """
+        Return the simulated latency of a request, in seconds.
+        """
+        base = self.instantiate_latency if instantiate else self.latency
+        return max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _throttled(self):
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            return True
+        if self.max_rps:
+            now = time.monotonic()
+            self.tokens = min(self.max_rps, self.tokens + (now - self.last_refill) * self.max_rps)
+            self.last_refill = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+        return False
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "requests": dict(self.requests),
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "batches": self.batches,
+            "http_requests": len(latencies),
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+            "service_principals": len(self.service_principals),
+            "applications": len(self.applications),
+        }
+
+    def handle(self, method: str, url: str, body: dict = None, base_url: str = ""):
+        """
+        Serve a Graph request (also used for the requests of a batch).
+
+        Args:
+            method (str): HTTP method.
+            url (str): Path and query string, with or without the /v1.0 prefix.
+            body (dict, optional): JSON body.
+            base_url (str): Absolute URL of the API (e.g. http://127.0.0.1:8765/v1.0), used for @odata.nextLink.
+
+        Returns:
+            tuple: (status, headers, JSON body or None).
+        """
+        parts = urlsplit(url)
+        path = parts.path[len(API_VERSION):] if parts.path.startswith(API_VERSION) else parts.path
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        segments = [unquote(segment) for segment in path.strip("/").split("/")]
+
+        if method == "POST" and segments == ["$batch"]:
+            return self._batch(body or {}, base_url)
+
+        route = "/" + "/".join("{id}" if i % 2 else segment for i, segment in enumerate(segments))
+        with self.lock:
+            self.requests[f"{method} {route}"] += 1
+            if self._throttled():
+                return graph_error(429, "TooManyRequests", "Too many requests.", {"Retry-After": f"{self.retry_after:g}"})
+            if self.error_rate and self.random.random() < self.error_rate:
+                return graph_error(500, "InternalServerError", "Transient error.")
+
+            collections = {
+                "applicationTemplates": lambda: self.templates,
+                "servicePrincipals": lambda: list(self.service_principals.values()),
+                "applications": lambda: list(self.applications.values()),
+                "users": lambda: self.users,
+                "oauth2PermissionGrants": lambda: [],
+            }
+            objects = {"servicePrincipals": self.service_principals, "applications": self.applications}
+
+            if len(segments) == 1 and method == "GET" and segments[0] in collections:
+                return self._page(collections[segments[0]](), path, query, base_url)
+            if len(segments) == 2 and segments[0] in objects:
+                store = objects[segments[0]]
+                if segments[1] not in store:
+                    return graph_error(404, "Request_ResourceNotFound", f"Resource '{segments[1]}' does not exist.")
+                if method == "GET":
+                    return 200, {}, self._select(store[segments[1]], query.get("$select"))
+                if method == "DELETE":
+                    del store[segments[1]]
+                    return 204, {}, None
+            if len(segments) == 3 and segments[0] == "applicationTemplates" and segments[2] == "instantiate" and method == "POST":
+                return self._instantiate(segments[1], (body or {}).get("displayName"))
+
+        return graph_error(400, "BadRequest", f"Unsupported request: {method} {path}")
+
+    def _select(self, obj: dict, select: str = None):
+        if not select:
+            return obj
+        return {field: obj.get(field) for field in select.split(",")}
+
+    def _page(self, items: list, path: str, query: dict, base_url: str):
+        odata_filter = query.get("$filter")
+        if odata_filter:
+            startswith = STARTSWITH_FILTER.match(odata_filter)
+            equals = EQUALS_FILTER.match(odata_filter)
+            if startswith:
+                field, prefix = startswith.group(1), startswith.group(2).replace("''", "'")
+                items = [item for item in items if str(item.get(field) or "").startswith(prefix)]
+            elif equals:
+                field, value = equals.group(1), equals.group(2).replace("''", "'")
+                items = [item for item in items if item.get(field) == value]
+            else:
+                return graph_error(400, "BadRequest", f"Unsupported filter: {odata_filter}")
+
+        top = int(query.get("$top", 100))
+        skip = int(query.get("$skiptoken", 0))
+        page = {"value": [self._select(item, query.get("$select")) for item in items[skip:skip + top]]}
+        if skip + top < len(items):
+            next_query = {key: value for key, value in query.items() if key != "$skiptoken"}
+            next_query["$skiptoken"] = skip + top
+            page["@odata.nextLink"] = f"{base_url}{path}?{urlencode(next_query)}"
+        return 200, {}, page
+
+    def _instantiate(self, template_id: str, display_name: str):
+        template = self.template_index.get(template_id)
+        if template is None:
+            return graph_error(404, "Request_ResourceNotFound", f"Template '{template_id}' does not exist.")
+        if template_id in self.invalid_templates:
+            return graph_error(400, "Request_BadRequest", "The application template cannot be instantiated.")
+
+        display_name = display_name or template["displayName"]
+        app_id = str(uuid.uuid4())
+        application = {
+            "id": str(uuid.uuid4()),
+            "appId": app_id,
+            "displayName": display_name,
+            "createdDateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "signInAudience": "AzureADMyOrg",
+            "tags": [],
+            "identifierUris": [],
+            "web": {"homePageUrl": template["homePageUrl"], "redirectUris": [f"{template['homePageUrl']}/callback"]},
+            "requiredResourceAccess": [],
+            "appRoles": [],
+        }
+        service_principal = {
+            "id": str(uuid.uuid4()),
+            "appId": app_id,
+            "displayName": display_name,
+            "appDisplayName": display_name,
+            "applicationTemplateId": template_id,
+            "accountEnabled": True,
+            "servicePrincipalType": "Application",
+            "servicePrincipalNames": [app_id],
+            "tags": ["WindowsAzureActiveDirectoryIntegratedApp"],
+            "replyUrls": application["web"]["redirectUris"],
+            "appRoles": [
+                {
+                    "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{template_id}-role-{i}")),
+                    "allowedMemberTypes": ["User"],
+                    "description": f"Role {i}",
+                    "displayName": f"Role {i}",
+                    "isEnabled": True,
+                    "value": f"role{i}",
+                }
+                for i in range(3)
+            ],
+            "oauth2PermissionScopes": [
+                {
+                    "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{template_id}-scope")),
+                    "adminConsentDescription": "Access the application on behalf of the signed-in user.",
+                    "adminConsentDisplayName": "Access the application",
+                    "isEnabled": True,
+                    "type": "User",
+                    "value": "user_impersonation",
+                }
+            ],
+        }
+        self.applications[application["id"]] = application
+        self.service_principals[service_principal["id"]] = service_principal
+        return 201, {}, {
+            "@odata.context": "https://graph.microsoft.com/v1.0/$metadata#microsoft.graph.applicationServicePrincipal",
+            "application": application,
+            "servicePrincipal": service_principal,
+        }
+
+    def _batch(self, body: dict, base_url: str):
+        requests = body.get("requests", [])
+        if len(requests) > MAX_BATCH_SIZE:
+            return graph_error(400, "BadRequest", f"A batch can contain at most {MAX_BATCH_SIZE} requests.")
+        with self.lock:
+            self.batches += 1
+
+        responses = []
+        for request in requests:
+            status, headers, response_body = self.handle(request.get("method", "GET"), request.get("url", ""), request.get("body"), base_url)
+            with self.lock:
+                self.statuses[status] += 1
+            response = {"id": request.get("id"), "status": status, "headers": headers}
+            if response_body is not None:
+                response["body"] = response_body
+            responses.append(response)
+        return 200, {}, {"responses": responses}
+
+
+class MockGraphRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"   # keep-alive, as with the real service
+
+    def _serve(self):
+        start = time.monotonic()
+        graph = self.server.graph
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = None
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                body = None
+
+        if self.path == "/_stats":
+            status, headers, response_body = 200, {}, graph.stats()
+        else:
+            time.sleep(graph.delay(instantiate=self.command == "POST" and self.path.rstrip("/").endswith("/instantiate")))
+            base_url = f"http://{self.headers.get('Host')}{API_VERSION}"
+            status, headers, response_body = graph.handle(self.command, self.path, body, base_url)
+
+        content = json.dumps(response_body).encode("utf-8") if response_body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if content:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+        if self.path != "/_stats":
+            with graph.lock:
+                graph.statuses[status] += 1
+                graph.latencies.append(time.monotonic() - start)
+
+    do_GET = do_POST = do_DELETE = do_PATCH = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockGraphServer:
+    """
+    Local HTTP server of a MockGraph, running in a background thread.
+
+    Point GraphClient to it with the GRAPH_BASE_URL environment variable (see `url`).
+    """
+
+    def __init__(self, graph: MockGraph = None, host: str = "127.0.0.1", port: int = 0):
+        self.graph = graph or MockGraph()
+        self.httpd = ThreadingHTTPServer((host, port), MockGraphRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.graph = self.graph
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{API_VERSION}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    """
+    Add the options of the MockGraph to a command line parser.
+    """
+    parser.add_argument("--templates", type=int, default=3000, help="number of application templates (default: 3000)")
+    parser.add_argument("--latency", type=float, default=0.02, help="base latency of every request, in seconds (default: 0.02)")
+    parser.add_argument("--instantiate-latency", type=float, default=0.3, help="base latency of an instantiation, in seconds (default: 0.3)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="random variation of the latencies, as a fraction (default: 0.5)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a transient 500 error (default: 0)")
+    parser.add_argument("--invalid-rate", type=float, default=0.35, help="fraction of the templates that cannot be instantiated (default: 0.35)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probability of a 429 response (default: 0)")
+    parser.add_argument("--max-rps", type=float, default=None, help="requests/sec accepted before throttling (default: unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the throttled requests, in seconds (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: 0)")
+
+
+def mock_from_args(args):
+    return MockGraph(
+        templates=args.templates,
+        latency=args.latency,
+        instantiate_latency=args.instantiate_latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        invalid_rate=args.invalid_rate,
+        throttle_rate=args.throttle_rate,
+        max_rps=args.max_rps,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local stand-in of the Microsoft Graph endpoints used by collect.py.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    add_mock_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = MockGraphServer(mock_from_args(args), host=args.host, port=args.port)
+    print(f"Mock Graph API listening on {server.url} ({args.templates} templates).")
+    print(f"Point the client to it with: GRAPH_BASE_URL={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.graph.stats(), indent=2))
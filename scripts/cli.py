@@ -0,0 +1,150 @@
+import sys
+import os
+import argparse
+import asyncio
+import json
+
+# Aggiunge la root del progetto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'apps')))
+
+# Only light modules are imported here: the Graph SDK (msgraph, kiota, azure.identity, httpx) is imported by the
+# commands that call Graph, when they do. Commands answered from local data (query, templates served from the
+# catalog cache, --help) never load it.
+from utils.catalog_cache import TemplateCatalogCache
+from utils.cleanup import DEFAULT_NAME_MARKER
+
+
+def graph_client(**kwargs):
+    """
+    Create a GraphClient, importing the Graph SDK on first use.
+    """
+    from utils.graph_client import GraphClient
+    return GraphClient(**kwargs)
+
+
+async def close(client):
+    """
+    Close the credential and the pooled connections of the client.
+    """
+    try:
+        await client.credential.close()
+    finally:
+        await client.transport.aclose()
+
+
+def print_records(records: list, fields: list, as_json: bool = False):
+    if as_json:
+        print(json.dumps(records, indent=2, ensure_ascii=False, default=str))
+        return
+    for record in records:
+        print("\t".join(str(record.get(field)) for field in fields))
+    print(f"\n{len(records)} results.")
+
+
+async def templates_command(args):
+    """
+    List the application templates, from the catalog cache while it is fresh (no Graph SDK import, no request).
+    """
+    cache = TemplateCatalogCache(args.cache_dir, ttl=args.ttl)
+    if not args.refresh:
+        from utils.profiles import CredentialProfile
+        profile = CredentialProfile.from_env()
+        entry = cache.load(profile.tenant_id, args.fields) if profile else None
+        if cache.is_fresh(entry):
+            print_records(entry["templates"], args.fields, args.json)
+            return
+
+    client = graph_client(catalog_cache=cache)
+    try:
+        templates = await client.list_application_template(select_fields=args.fields, refresh=args.refresh)
+    finally:
+        await close(client)
+    print_records(templates, args.fields, args.json)
+
+
+async def users_command(args):
+    client = graph_client()
+    try:
+        users = [user async for user in client.iter_users(select=args.fields)]
+    finally:
+        await close(client)
+    print_records(users, args.fields, args.json)
+
+
+async def instantiate_one_command(args):
+    """
+    Instantiate one template, print its application and service principal, then delete them (unless --keep).
+    """
+    from utils.serializer import to_serializable
+
+    client = graph_client()
+    try:
+        display_name = args.display_name or args.template_id
+        app_info = await client.instantiate_application(args.template_id, f"{args.name_marker}{display_name}", raise_errors=True)
+        if not app_info:
+            print(f"Template {args.template_id} returned no application.")
+            return
+        print(json.dumps(
+            {"application": to_serializable(app_info["application"]), "servicePrincipal": to_serializable(app_info["servicePrincipal"])},
+            indent=2, ensure_ascii=False,
+        ))
+        if not args.keep:
+            deleted = await client.delete_service_principal(app_info["servicePrincipal"].id)
+            deleted = await client.delete_application(app_info["application"].id) and deleted
+            print(f"\nDeleted the service principal and the application: {deleted}.")
+    finally:
+        await close(client)
+
+
+def parse_args(argv: list = None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Collect and query Microsoft Entra application metadata.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # collect and query keep their own options: listed here for --help, dispatched by main()
+    commands.add_parser("collect", add_help=False, help="collect the gallery applications (options of scripts/apps/collect.py)")
+    commands.add_parser("query", add_help=False, help="build and query the local index (options of scripts/apps/query_index.py)")
+
+    templates_parser = commands.add_parser("templates", help="list the application templates (from the catalog cache while fresh)")
+    templates_parser.add_argument("--fields", type=lambda value: value.split(","), default=["id", "display_name"], help="comma-separated fields (default: id,display_name)")
+    templates_parser.add_argument("--refresh", action="store_true", help="download the catalog even if the cached one is still fresh")
+    templates_parser.add_argument("--cache-dir", default="data/cache", help="directory of the catalog cache (default: data/cache)")
+    templates_parser.add_argument("--ttl", type=float, default=24 * 3600, help="seconds a cached catalog is used (default: 86400)")
+    templates_parser.add_argument("--json", action="store_true", help="print the templates as JSON")
+
+    users_parser = commands.add_parser("users", help="list the users of the tenant")
+    users_parser.add_argument("--fields", type=lambda value: value.split(","), default=["id", "displayName"], help="comma-separated fields (default: id,displayName)")
+    users_parser.add_argument("--json", action="store_true", help="print the users as JSON")
+
+    instantiate_parser = commands.add_parser("instantiate-one", help="instantiate one template, print the objects and delete them")
+    instantiate_parser.add_argument("template_id")
+    instantiate_parser.add_argument("--display-name", default=None, help="display name of the application (default: the template ID)")
+    instantiate_parser.add_argument("--name-marker", default=DEFAULT_NAME_MARKER, help=f"prefix of the display name, found by the orphan sweeper (default: '{DEFAULT_NAME_MARKER}')")
+    instantiate_parser.add_argument("--keep", action="store_true", help="do not delete the instantiated objects")
+
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    # collect and query parse their own arguments (and import only what they need)
+    if argv and argv[0] == "collect":
+        import collect
+        collect.main(argv[1:], prog="cli.py collect")
+    elif argv and argv[0] == "query":
+        import query_index
+        query_index.main(argv[1:], prog="cli.py query")
+    else:
+        args = parse_args(argv)
+        command = {
+            "templates": templates_command,
+            "users": users_command,
+            "instantiate-one": instantiate_one_command,
+        }[args.command]
+        asyncio.run(command(args))
+
+
+if __name__ == "__main__":
+    main()
+    print("\nEnd of Script.")
@@ -6,6 +6,7 @@ import asyncio
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from utils.graph_client import GraphClient 
+from utils.catalog_cache import TemplateCatalogCache
 
 async def setup():
     """
@@ -14,7 +15,7 @@ async def setup():
     """
 
 
-    client = GraphClient()
+    client = GraphClient(catalog_cache=TemplateCatalogCache())
 
     templates = await client.list_application_template()
     if templates:
@@ -7,6 +7,7 @@ import json
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from utils.graph_client import GraphClient 
+from utils.catalog_cache import TemplateCatalogCache
 
 
 # Utility function to print application and service principal information
@@ -100,7 +101,7 @@ async def setup():
     """
 
 
-    client = GraphClient()
+    client = GraphClient(catalog_cache=TemplateCatalogCache())
 
     templates = await client.list_application_template()
     if templates:
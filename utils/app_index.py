@@ -0,0 +1,304 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from utils.catalog_cache import fingerprint
+
+
+# Kinds of the indexed terms
+SCOPE = "scope"             # delegated permission exposed by the service principal (oauth2PermissionScopes value)
+ROLE = "role"               # app role exposed by the service principal (appRoles value)
+PERMISSION = "permission"   # permission requested by the application (requiredResourceAccess id)
+RESOURCE = "resource"       # API requested by the application (requiredResourceAccess resourceAppId)
+TAG = "tag"                 # tag of the service principal or of the application
+DOMAIN = "domain"           # domain (and parent domains) of the reply URLs
+
+TERM_KINDS = (SCOPE, ROLE, PERMISSION, RESOURCE, TAG, DOMAIN)
+
+# Microsoft Graph, the resource of most of the requested permissions
+MICROSOFT_GRAPH_APP_ID = "00000003-0000-0000-c000-000000000000"
+
+GUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+def reply_url_domains(url: str):
+    """
+    Return the domain of a reply URL and its parent domains (e.g. app.contoso.com and contoso.com),
+    so that a domain lookup also finds the subdomains.
+    """
+    try:
+        hostname = urlsplit(url.strip()).hostname
+    except (AttributeError, ValueError):
+        return []
+    if not hostname:
+        return []
+    labels = hostname.lower().split(".")
+    return [".".join(labels[i:]) for i in range(max(1, len(labels) - 1))]
+
+
+def index_terms(application: dict, service_principal: dict):
+    """
+    Return the (kind, value) terms under which a collected application is indexed. Values are lowercase.
+    """
+    terms = set()
+    for scope in service_principal.get("oauth2_permission_scopes") or []:
+        if scope.get("value"):
+            terms.add((SCOPE, scope["value"].lower()))
+    for role in service_principal.get("app_roles") or []:
+        if role.get("value"):
+            terms.add((ROLE, role["value"].lower()))
+    for resource in application.get("required_resource_access") or []:
+        if resource.get("resource_app_id"):
+            terms.add((RESOURCE, str(resource["resource_app_id"]).lower()))
+        for access in resource.get("resource_access") or []:
+            if access.get("id"):
+                terms.add((PERMISSION, str(access["id"]).lower()))
+    for tag in (service_principal.get("tags") or []) + (application.get("tags") or []):
+        terms.add((TAG, str(tag).lower()))
+
+    reply_urls = list(service_principal.get("reply_urls") or [])
+    reply_urls += (application.get("web") or {}).get("redirect_uris") or []
+    for url in reply_urls:
+        for domain in reply_url_domains(str(url)):
+            terms.add((DOMAIN, domain))
+    return terms
+
+
+class AppIndex:
+    """
+    Indexed store of the collected applications, in a SQLite database.
+
+    Every collected application (keyed by its application template, or by its appId) is stored once with
+    its data, and an inverted index maps every term (exposed scopes and app roles, requested permissions and
+    resources, tags, reply URL domains) to the applications, so that questions like "which apps request
+    Mail.ReadWrite" are answered with an index lookup instead of scanning the output files.
+
+    Requested permissions are stored by ID, as in requiredResourceAccess: their names are resolved through
+    the permissions of the resource APIs saved with add_resource() (e.g. Microsoft Graph's).
+    """
+
+    def __init__(self, path: str = "data/app_index.sqlite"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS apps (
+                key TEXT PRIMARY KEY,
+                app_id TEXT,
+                service_principal_id TEXT,
+                application_id TEXT,
+                display_name TEXT,
+                fingerprint TEXT NOT NULL,
+                application TEXT,
+                service_principal TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                key TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS terms_by_value ON terms (kind, value);
+            CREATE INDEX IF NOT EXISTS terms_by_key ON terms (key);
+            CREATE TABLE IF NOT EXISTS permissions (
+                resource_app_id TEXT NOT NULL,
+                permission_id TEXT NOT NULL,
+                value TEXT NOT NULL,
+                type TEXT NOT NULL,
+                PRIMARY KEY (resource_app_id, permission_id, type)
+            );
+            CREATE INDEX IF NOT EXISTS permissions_by_value ON permissions (value);
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def key(application: dict, service_principal: dict):
+        return service_principal.get("application_template_id") or service_principal.get("app_id") or application.get("app_id")
+
+    def sync(self, collected, prune: bool = True):
+        """
+        Update the index with the data of a collection run.
+
+        Applications whose stored row (IDs, display name and data) did not change are not written again. Every run
+        instantiates new objects, so the rows of a new run are updated with the new object IDs, but the terms of an
+        application are only rewritten when they changed.
+
+        Args:
+            collected (iterable): (application dict, service principal dict) pairs, e.g. CollectionWriter.read().
+            prune (bool): If True, the applications that are not in `collected` are removed
+                (i.e. `collected` is the complete output of a run).
+
+        Returns:
+            dict: Number of 'added', 'changed', 'unchanged' and 'removed' applications.
+        """
+        previous = dict(self.connection.execute("SELECT key, fingerprint FROM apps"))
+        seen = set()
+        counts = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+        now = time.time()
+
+        with self.connection:
+            for application, service_principal in collected:
+                key = self.key(application, service_principal)
+                if key is None or key in seen:
+                    continue
+                seen.add(key)
+
+                display_name = service_principal.get("display_name") or application.get("display_name")
+                row = (
+                    service_principal.get("app_id") or application.get("app_id"),
+                    service_principal.get("id"),
+                    application.get("id"),
+                    display_name,
+                    json.dumps(application, ensure_ascii=False),
+                    json.dumps(service_principal, ensure_ascii=False),
+                )
+                # every stored column: a change of any of them is written back
+                row_fingerprint = fingerprint(row)
+                if previous.get(key) == row_fingerprint:
+                    counts["unchanged"] += 1
+                    continue
+                counts["changed" if key in previous else "added"] += 1
+
+                app_id, service_principal_id, application_id, _, application_json, service_principal_json = row
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO apps (key, app_id, service_principal_id, application_id, display_name, fingerprint, "
+                    "application, service_principal, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, app_id, service_principal_id, application_id, display_name, row_fingerprint,
+                     application_json, service_principal_json, now),
+                )
+
+                terms = index_terms(application, service_principal)
+                if key in previous and set(self.connection.execute("SELECT kind, value FROM terms WHERE key = ?", (key,))) == terms:
+                    continue  # e.g. only the object IDs of the new run differ
+                self.connection.execute("DELETE FROM terms WHERE key = ?", (key,))
+                self.connection.executemany("INSERT INTO terms (kind, value, key) VALUES (?, ?, ?)", [(kind, value, key) for kind, value in terms])
+
+            if prune:
+                removed = [(key,) for key in previous if key not in seen]
+                self.connection.executemany("DELETE FROM terms WHERE key = ?", removed)
+                self.connection.executemany("DELETE FROM apps WHERE key = ?", removed)
+                counts["removed"] = len(removed)
+
+        return counts
+
+    def add_resource(self, service_principal: dict):
+        """
+        Save the names of the permissions exposed by a resource API (e.g. the service principal of Microsoft Graph),
+        used to resolve the permissions requested by the applications.
+
+        Args:
+            service_principal (dict): Service principal of the resource with 'app_id', 'oauth2_permission_scopes' and 'app_roles'.
+
+        Returns:
+            int: Number of permissions saved.
+        """
+        resource_app_id = str(service_principal.get("app_id")).lower()
+        rows = [
+            (resource_app_id, str(scope["id"]).lower(), scope["value"].lower(), "Scope")
+            for scope in service_principal.get("oauth2_permission_scopes") or [] if scope.get("id") and scope.get("value")
+        ]
+        rows += [
+            (resource_app_id, str(role["id"]).lower(), role["value"].lower(), "Role")
+            for role in service_principal.get("app_roles") or [] if role.get("id") and role.get("value")
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO permissions (resource_app_id, permission_id, value, type) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _apps(self, kind: str, values: list):
+        if not values:
+            return []
+        placeholders = ",".join("?" * len(values))
+        cursor = self.connection.execute(
+            f"SELECT DISTINCT apps.key, apps.display_name, apps.app_id, apps.service_principal_id FROM terms "
+            f"JOIN apps ON apps.key = terms.key WHERE terms.kind = ? AND terms.value IN ({placeholders}) ORDER BY apps.display_name",
+            (kind, *values),
+        )
+        return [
+            {"key": key, "display_name": display_name, "app_id": app_id, "service_principal_id": service_principal_id}
+            for key, display_name, app_id, service_principal_id in cursor
+        ]
+
+    def find(self, kind: str, value: str):
+        """
+        Return the applications indexed under a term.
+
+        Args:
+            kind (str): One of TERM_KINDS.
+            value (str): Term value (case-insensitive).
+
+        Returns:
+            list of dict: Applications with 'key' (template ID), 'display_name', 'app_id' and 'service_principal_id'.
+        """
+        if kind not in TERM_KINDS:
+            raise ValueError(f"Unsupported term kind: {kind}")
+        return self._apps(kind, [value.strip().lower()])
+
+    def requesting(self, permission: str, resource_app_id: str = None, permission_type: str = None):
+        """
+        Return the applications requesting a permission, given by name (e.g. 'Mail.ReadWrite') or by ID.
+
+        Args:
+            permission (str): Permission name or ID.
+            resource_app_id (str, optional): Only the permissions of this resource API (e.g. MICROSOFT_GRAPH_APP_ID).
+            permission_type (str, optional): 'Scope' (delegated) or 'Role' (application).
+
+        Returns:
+            list of dict: See find().
+        """
+        permission = permission.strip().lower()
+        if GUID.match(permission):
+            return self._apps(PERMISSION, [permission])
+
+        query = "SELECT permission_id FROM permissions WHERE value = ?"
+        parameters = [permission]
+        if resource_app_id:
+            query += " AND resource_app_id = ?"
+            parameters.append(resource_app_id.lower())
+        if permission_type:
+            query += " AND type = ?"
+            parameters.append(permission_type)
+        permission_ids = [row[0] for row in self.connection.execute(query, parameters)]
+        return self._apps(PERMISSION, permission_ids)
+
+    def search(self, text: str):
+        """
+        Return the applications whose display name contains `text` (case-insensitive).
+        """
+        cursor = self.connection.execute(
+            "SELECT key, display_name, app_id, service_principal_id FROM apps WHERE display_name LIKE ? ORDER BY display_name",
+            (f"%{text}%",),
+        )
+        return [
+            {"key": key, "display_name": display_name, "app_id": app_id, "service_principal_id": service_principal_id}
+            for key, display_name, app_id, service_principal_id in cursor
+        ]
+
+    def get(self, key: str):
+        """
+        Return the stored (application, service principal) data of an application, or None.
+        """
+        row = self.connection.execute("SELECT application, service_principal FROM apps WHERE key = ?", (key,)).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of applications, of terms per kind and of known permission names.
+        """
+        return {
+            "apps": self.connection.execute("SELECT COUNT(*) FROM apps").fetchone()[0],
+            "terms": dict(self.connection.execute("SELECT kind, COUNT(*) FROM terms GROUP BY kind")),
+            "permissions": self.connection.execute("SELECT COUNT(*) FROM permissions").fetchone()[0],
+        }
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class AsyncTTLCache:
+    """
+    In-memory LRU cache of the results of async lookups, with a time-to-live per entry.
+
+    get_or_load() returns the cached result of a key while it is fresh; otherwise it runs the loader and caches
+    its result (None included, e.g. an object that does not exist). Loads are single-flight: concurrent
+    lookups of the same key share the same in-flight call instead of sending duplicate requests, unless they
+    bypass the cache (refresh=True). Errors are not cached: the next lookup runs the loader again.
+
+    When more than `maxsize` entries are cached, the least recently used ones are evicted.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 600.0):
+        """
+        Args:
+            maxsize (int): Maximum number of cached entries.
+            ttl (float): Seconds a cached result is returned before it is loaded again.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.entries = OrderedDict()    # key -> (expiry, value), least recently used first
+        self.loading = {}               # key -> future of the load in progress
+
+        # counters
+        self.hits = 0
+        self.misses = 0         # lookups that ran the loader
+        self.coalesced = 0      # lookups that joined a load already in progress
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Return the cached value of a key if it is fresh, else `default` (the loader is never run).
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        expiry, value = entry
+        if expiry <= time.monotonic():
+            del self.entries[key]
+            self.expired += 1
+            return default
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader, refresh: bool = False):
+        """
+        Return the cached value of a key, loading it with `loader` if it is missing or expired.
+
+        Args:
+            key: Hashable key of the lookup.
+            loader (callable): Coroutine function without arguments returning the value of the key.
+            refresh (bool, optional): If True, bypass the cache: the loader is run again even if the key is cached or
+                already being loaded, and its result replaces the cached one (later lookups join this load).
+
+        Returns:
+            The cached or loaded value.
+
+        Raises:
+            Exception: The error raised by the loader (shared by the lookups that joined the same load).
+        """
+        if not refresh:
+            missing = object()
+            value = self.get(key, missing)
+            if value is not missing:
+                self.hits += 1
+                return value
+
+        future = None if refresh else self.loading.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            future = asyncio.ensure_future(loader())
+            self.loading[key] = future
+            future.add_done_callback(lambda done: self._loaded(key, done))
+        # a cancelled lookup does not cancel the load shared with the other lookups
+        return await asyncio.shield(future)
+
+    def _loaded(self, key, future):
+        # only the latest load of a key is cached: a load overtaken by a refresh does not overwrite its result
+        if self.loading.get(key) is not future:
+            return
+        del self.loading[key]
+        if not future.cancelled() and future.exception() is None:
+            self.put(key, future.result())
+
+    def invalidate(self, key):
+        """
+        Drop the cached value of a key (a load already in progress is not affected).
+        """
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Lookup counters and number of cached entries.
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
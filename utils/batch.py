@@ -0,0 +1,183 @@
+import asyncio
+import random
+
+from utils.errors import GraphThrottledError, THROTTLING_STATUS_CODES, parse_retry_after
+
+
+# Maximum number of requests accepted by Microsoft Graph in a single JSON batch
+MAX_BATCH_SIZE = 20
+
+
+class BatchResponse:
+    """
+    Response of a single request sent inside a JSON batch.
+    """
+
+    def __init__(self, status: int, headers: dict = None, body=None):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def header(self, name: str):
+        for key, value in self.headers.items():
+            if key.lower() == name.lower():
+                return value
+        return None
+
+
+class GraphBatcher:
+    """
+    Groups single Graph requests into JSON batches (POST /$batch) of up to 20 requests.
+
+    Callers submit a request and await its own response, while the batcher sends the pending requests
+    together when `max_size` requests are queued or `max_wait` seconds after the first of them.
+    Sub-requests throttled by Graph (429/503) are sent again in a following batch, waiting for their
+    Retry-After or for a jittered exponential backoff; after `max_retries` retries their caller gets a
+    GraphThrottledError.
+    """
+
+    def __init__(self, send, max_size: int = MAX_BATCH_SIZE, max_wait: float = 0.05,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0, on_retry_after=None):
+        """
+        Args:
+            send (callable): Coroutine function sending a list of batch requests (dicts with 'id', 'method', 'url'...)
+                and returning the list of batch responses (dicts with 'id', 'status', 'headers', 'body').
+            max_size (int): Number of queued requests that triggers a batch (at most 20).
+            max_wait (float): Seconds a request can wait for other requests before its batch is sent.
+            max_retries (int): Retries of a throttled sub-request before giving up.
+            base_delay (float): Base delay of the exponential backoff, in seconds.
+            max_delay (float): Maximum delay of the exponential backoff, in seconds.
+            on_retry_after (callable, optional): Called with the Retry-After seconds of a throttled sub-request
+                (e.g. to pause the client-wide token bucket).
+        """
+        self.send = send
+        self.max_size = min(max_size, MAX_BATCH_SIZE)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_retry_after = on_retry_after
+
+        self.pending = []       # (request, future, attempt) waiting for the next batch
+        self.tasks = set()      # batches being sent (and retries being waited for)
+        self._timer = None
+
+        # counters
+        self.batches = 0
+        self.requests = 0
+        self.throttled = 0
+
+    async def submit(self, method: str, url: str, body=None, headers: dict = None):
+        """
+        Queue a request for the next batch and wait for its response.
+
+        Args:
+            method (str): HTTP method (e.g. 'GET', 'DELETE').
+            url (str): URL relative to the Graph version root (e.g. '/servicePrincipals/{id}').
+            body (dict, optional): JSON body of the request.
+            headers (dict, optional): Headers of the request.
+
+        Returns:
+            BatchResponse: The response of the request.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
+        """
+        request = {"method": method, "url": url}
+        if body is not None:
+            request["body"] = body
+            request["headers"] = {"Content-Type": "application/json", **(headers or {})}
+        elif headers:
+            request["headers"] = headers
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(request, future, 0)
+        return await future
+
+    def _enqueue(self, request: dict, future, attempt: int):
+        self.pending.append((request, future, attempt))
+        if len(self.pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush_now)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.pending:
+            items, self.pending = self.pending[:self.max_size], self.pending[self.max_size:]
+            self._spawn(self._send_batch(items))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush(self):
+        """
+        Send every queued request and wait until all the batches (retries included) are completed.
+        """
+        while self.pending or self.tasks:
+            self._flush_now()
+            if self.tasks:
+                await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    async def _send_batch(self, items: list):
+        requests = [dict(request, id=str(i)) for i, (request, _, _) in enumerate(items)]
+        self.batches += 1
+        self.requests += len(requests)
+
+        try:
+            responses = await self.send(requests)
+        except Exception as e:
+            # the whole batch failed: every caller gets the error
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        responses = {str(response.get("id")): response for response in responses or []}
+
+        retries = []
+        for i, (request, future, attempt) in enumerate(items):
+            if future.done():
+                continue  # the caller was cancelled
+            response = responses.get(str(i))
+            if response is None:
+                future.set_exception(RuntimeError(f"Missing response for batch request {request['method']} {request['url']}"))
+                continue
+
+            result = BatchResponse(response.get("status", 0), response.get("headers"), response.get("body"))
+            if result.status not in THROTTLING_STATUS_CODES:
+                future.set_result(result)
+                continue
+
+            self.throttled += 1
+            retry_after = parse_retry_after(result.header("Retry-After"))
+            if attempt >= self.max_retries:
+                future.set_exception(GraphThrottledError(
+                    f"Batch request {request['method']} {request['url']} still throttled after {self.max_retries} retries",
+                    status_code=result.status,
+                    retry_after=retry_after,
+                ))
+                continue
+            retries.append((request, future, attempt + 1, retry_after))
+
+        for request, future, attempt, retry_after in retries:
+            self._spawn(self._retry_later(request, future, attempt, retry_after))
+
+    async def _retry_later(self, request: dict, future, attempt: int, retry_after: float = None):
+        if retry_after is not None:
+            if self.on_retry_after is not None:
+                self.on_retry_after(retry_after)
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        await asyncio.sleep(delay)
+        if not future.done():
+            self._enqueue(request, future, attempt)
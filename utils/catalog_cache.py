@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import time
+
+from utils.serializer import to_serializable
+
+
+def fingerprint(record: dict):
+    """
+    Return a short hash of a record, used to detect the templates that changed between two downloads.
+    """
+    content = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CatalogChanges:
+    """
+    Difference between two versions of the application template catalog.
+    """
+
+    def __init__(self, added: list = None, removed: list = None, changed: list = None):
+        self.added = added or []        # IDs of the new templates
+        self.removed = removed or []    # IDs of the templates no longer in the gallery
+        self.changed = changed or []    # IDs of the templates whose selected fields changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f"CatalogChanges(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})"
+
+    @classmethod
+    def compare(cls, previous: dict, current: dict):
+        """
+        Args:
+            previous (dict): template ID -> fingerprint of the previous catalog.
+            current (dict): template ID -> fingerprint of the current catalog.
+        """
+        return cls(
+            added=[template_id for template_id in current if template_id not in previous],
+            removed=[template_id for template_id in previous if template_id not in current],
+            changed=[template_id for template_id, value in current.items() if template_id in previous and previous[template_id] != value],
+        )
+
+
+class TemplateCatalogCache:
+    """
+    On-disk cache of the application template catalog, used by GraphClient.list_application_template().
+
+    Every entry is keyed by tenant and selected fields and is considered fresh for `ttl` seconds.
+    Graph does not offer delta queries on /applicationTemplates, so a refresh downloads the catalog again,
+    but only the selected fields ($select), and compares the per-template fingerprints with the cached
+    ones to report the added, removed and changed templates.
+    """
+
+    def __init__(self, directory: str = "data/cache", ttl: float = 24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, tenant_id: str, select_fields: list):
+        key = hashlib.sha1(f"{tenant_id}|{','.join(sorted(select_fields))}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"application_templates-{key}.json")
+
+    def load(self, tenant_id: str, select_fields: list):
+        """
+        Returns:
+            dict or None: The cache entry ('fetched_at', 'templates', 'fingerprints'...), or None if missing or unreadable.
+        """
+        try:
+            with open(self.path(tenant_id, select_fields), "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        return entry is not None and time.time() - entry.get("fetched_at", 0) < ttl
+
+    def store(self, tenant_id: str, select_fields: list, templates: list):
+        """
+        Save a freshly downloaded catalog and return what changed since the cached one.
+
+        Returns:
+            CatalogChanges: Templates added, removed and changed since the previous entry
+                (every template is 'added' when there was no entry).
+        """
+        previous = self.load(tenant_id, select_fields)
+
+        templates = to_serializable(templates)
+        fingerprints = {template.get("id"): fingerprint(template) for template in templates}
+        entry = {
+            "tenant_id": tenant_id,
+            "select": list(select_fields),
+            "fetched_at": time.time(),
+            "templates": templates,
+            "fingerprints": fingerprints,
+        }
+
+        path = self.path(tenant_id, select_fields)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}.partial"
+        with open(partial_path, "w", encoding="utf-8") as cache_file:
+            json.dump(entry, cache_file, ensure_ascii=False)
+        os.replace(partial_path, path)
+
+        return CatalogChanges.compare(previous.get("fingerprints", {}) if previous else {}, fingerprints)
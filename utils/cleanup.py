@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import random
+
+from utils.errors import GraphThrottledError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Prefix added to the display name of the applications instantiated by collect(),
+# used by the orphan sweeper to find the objects left behind by earlier runs
+DEFAULT_NAME_MARKER = "[collect] "
+
+
+class CleanupJob:
+    """
+    Deletion of the objects created by one instantiation: its service principal and its application object.
+    """
+
+    def __init__(self, service_principal_id: str = None, application_id: str = None, key=None):
+        self.service_principal_id = service_principal_id
+        self.application_id = application_id
+        self.key = key              # opaque value handed back to the on_done callback (e.g. the template ID)
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"CleanupJob(service_principal_id={self.service_principal_id}, application_id={self.application_id})"
+
+
+class CleanupEngine:
+    """
+    Background deletion of the service principals and application objects created by the instantiations.
+
+    Jobs are submitted without waiting (off the hot path of collect()) and run by `workers` background tasks.
+    Every job deletes the service principal first and then the application object (app registration),
+    through JSON batches when `batched` is True. Failed deletions are retried up to `max_attempts` times
+    with a jittered backoff; the deletions already done are not sent again.
+    """
+
+    def __init__(self, client, batched: bool = True, workers: int = 20, max_attempts: int = 3, retry_delay: float = 5.0, on_done=None):
+        """
+        Args:
+            client (GraphClient): Client used for the deletions.
+            batched (bool): If True, the deletions are grouped in JSON batches.
+            workers (int): Number of concurrent jobs (with batching, enough jobs to fill a batch).
+            max_attempts (int): Attempts of a job before giving up.
+            retry_delay (float): Base delay between two attempts, in seconds.
+            on_done (callable, optional): Called with (job, deleted) when a job is completed or given up.
+        """
+        self.client = client
+        self.batched = batched
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.on_done = on_done
+
+        self.queue = None
+        self.tasks = []
+        self.submitted_ids = set()  # IDs already submitted (the sweeper does not submit them twice)
+
+        # counters
+        self.submitted = 0
+        self.deleted = 0
+        self.failed = 0
+        self.errors = 0     # unexpected errors of the deletions (see _delete)
+
+    def start(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, service_principal_id: str = None, application_id: str = None, key=None):
+        """
+        Queue the deletion of a service principal and/or an application object, without waiting for it.
+        """
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        for object_id in (service_principal_id, application_id):
+            if object_id:
+                self.submitted_ids.add(object_id)
+        self.submitted += 1
+        self.queue.put_nowait(CleanupJob(service_principal_id, application_id, key))
+
+    async def join(self):
+        """
+        Wait until every submitted job is completed, then stop the workers.
+        """
+        if self.queue is not None:
+            await self.queue.join()
+        await self.stop()
+
+    async def stop(self):
+        """
+        Stop the workers without waiting for the queued jobs (e.g. when the run fails).
+        """
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                deleted = await self._run(job)
+                if deleted:
+                    self.deleted += 1
+                else:
+                    self.failed += 1
+                if self.on_done is not None:
+                    self.on_done(job, deleted)
+            finally:
+                self.queue.task_done()
+
+    async def _delete(self, delete, object_id: str):
+        try:
+            return await delete(object_id, batched=self.batched)
+        except GraphThrottledError:
+            # still throttled after the client retries: retried by _run
+            return False
+        except Exception:
+            # the client methods handle the failed requests themselves (objects already deleted included):
+            # anything else is unexpected, reported here and retried by _run
+            self.errors += 1
+            logger.exception("Unexpected error while deleting %s", object_id)
+            return False
+
+    async def _run(self, job: CleanupJob):
+        while True:
+            job.attempts += 1
+
+            # the service principal first: deleting the application object does not need it anymore
+            if job.service_principal_id and await self._delete(self.client.delete_service_principal, job.service_principal_id):
+                job.service_principal_id = None
+            if not job.service_principal_id and job.application_id:
+                if await self._delete(self.client.delete_application, job.application_id):
+                    job.application_id = None
+
+            if not job.service_principal_id and not job.application_id:
+                return True
+            if job.attempts >= self.max_attempts:
+                logger.warning("Gave up %r after %d attempts", job, job.attempts)
+                return False
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.retry_delay * 2 ** (job.attempts - 1))
+
+    async def sweep_orphans(self, marker: str = DEFAULT_NAME_MARKER):
+        """
+        Find the service principals and application objects whose display name starts with `marker`
+        (i.e. left behind by earlier runs) and submit their deletion.
+
+        Must be called before the new run instantiates any application, otherwise its objects are swept too.
+
+        Returns:
+            int: Number of orphaned objects submitted for deletion.
+        """
+        # OData string literal: single quotes are doubled
+        literal = marker.replace("'", "''")
+        odata_filter = f"startswith(displayName,'{literal}')"
+
+        orphans = 0
+        async for service_principal in self.client.iter_service_principals(select=["id"], filter=odata_filter):
+            if service_principal["id"] not in self.submitted_ids:
+                self.submit(service_principal_id=service_principal["id"])
+                orphans += 1
+        async for application in self.client.iter_applications(select=["id"], filter=odata_filter):
+            if application["id"] not in self.submitted_ids:
+                self.submit(application_id=application["id"])
+                orphans += 1
+        return orphans
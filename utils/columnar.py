@@ -0,0 +1,255 @@
+import os
+
+
+# File extension of each supported columnar format
+COLUMNAR_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Default compression of each format: Arrow IPC files are left uncompressed so that they can be memory-mapped
+# without copies
+DEFAULT_COMPRESSION = {"parquet": "zstd", "arrow": None}
+
+# Columns of the tables: (column, type) with type 'string', 'bool' or 'list' (list of strings).
+# The tables are linked by the object IDs and by app_id.
+TABLES = {
+    "applications": [
+        ("id", "string"),
+        ("app_id", "string"),
+        ("display_name", "string"),
+        ("description", "string"),
+        ("sign_in_audience", "string"),
+        ("publisher_domain", "string"),
+        ("created_date_time", "string"),
+        ("identifier_uris", "list"),
+        ("tags", "list"),
+    ],
+    "service_principals": [
+        ("id", "string"),
+        ("app_id", "string"),
+        ("display_name", "string"),
+        ("app_display_name", "string"),
+        ("application_template_id", "string"),
+        ("service_principal_type", "string"),
+        ("account_enabled", "bool"),
+        ("app_owner_organization_id", "string"),
+        ("publisher_name", "string"),
+        ("sign_in_audience", "string"),
+        ("preferred_single_sign_on_mode", "string"),
+        ("homepage", "string"),
+        ("login_url", "string"),
+        ("reply_urls", "list"),
+        ("tags", "list"),
+    ],
+    "oauth2_permission_scopes": [
+        ("service_principal_id", "string"),
+        ("app_id", "string"),
+        ("id", "string"),
+        ("value", "string"),
+        ("type", "string"),
+        ("is_enabled", "bool"),
+        ("origin", "string"),
+        ("admin_consent_display_name", "string"),
+        ("admin_consent_description", "string"),
+        ("user_consent_display_name", "string"),
+        ("user_consent_description", "string"),
+    ],
+    "app_roles": [
+        ("service_principal_id", "string"),
+        ("app_id", "string"),
+        ("id", "string"),
+        ("value", "string"),
+        ("display_name", "string"),
+        ("description", "string"),
+        ("is_enabled", "bool"),
+        ("origin", "string"),
+        ("allowed_member_types", "list"),
+    ],
+    "required_resource_access": [
+        ("application_id", "string"),
+        ("app_id", "string"),
+        ("resource_app_id", "string"),
+        ("resource_access_id", "string"),
+        ("type", "string"),
+    ],
+}
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The columnar export requires the pyarrow package: pip install pyarrow") from e
+    return pyarrow
+
+
+def flatten(application: dict, service_principal: dict):
+    """
+    Normalize a collected application and its service principal into the rows of the columnar tables.
+
+    Returns:
+        dict: table name -> list of rows (dictionaries keyed by column).
+    """
+    service_principal_id = service_principal.get("id")
+    app_id = service_principal.get("app_id") or application.get("app_id")
+
+    rows = {
+        "applications": [application],
+        "service_principals": [service_principal],
+        "oauth2_permission_scopes": [
+            {**scope, "service_principal_id": service_principal_id, "app_id": app_id}
+            for scope in service_principal.get("oauth2_permission_scopes") or []
+        ],
+        "app_roles": [
+            {**role, "service_principal_id": service_principal_id, "app_id": app_id}
+            for role in service_principal.get("app_roles") or []
+        ],
+        "required_resource_access": [
+            {
+                "application_id": application.get("id"),
+                "app_id": application.get("app_id"),
+                "resource_app_id": resource.get("resource_app_id"),
+                "resource_access_id": access.get("id"),
+                "type": access.get("type"),
+            }
+            for resource in application.get("required_resource_access") or []
+            for access in resource.get("resource_access") or []
+        ],
+    }
+    return rows
+
+
+def _convert(value, kind: str):
+    if value is None:
+        return None
+    if kind == "bool":
+        return bool(value)
+    if kind == "list":
+        return [str(item) for item in value if item is not None]
+    return str(value)
+
+
+class ColumnarExporter:
+    """
+    Writes the collected applications and service principals as linked columnar tables
+    (applications, service_principals, oauth2_permission_scopes, app_roles, required_resource_access),
+    one Parquet or Arrow IPC file per table under `directory`.
+
+    Rows are buffered per table and written as record batches of `batch_size` rows, so memory does not grow
+    with the catalog. As with the other outputs, the files are written to `<path>.partial` and moved to their
+    final paths when the exporter is closed.
+
+    Requires the optional `pyarrow` package (pip install pyarrow).
+    """
+
+    def __init__(self, directory: str = "data/columnar", format: str = "parquet", compression: str = None, batch_size: int = 10000):
+        """
+        Args:
+            directory (str): Directory of the table files.
+            format (str): 'parquet' or 'arrow' (Arrow IPC file, memory-mappable).
+            compression (str, optional): Compression codec (e.g. 'zstd', 'snappy', 'lz4').
+                Defaults to zstd for Parquet and to no compression for Arrow.
+            batch_size (int): Rows buffered per table before a record batch is written.
+        """
+        if format not in COLUMNAR_EXTENSIONS:
+            raise ValueError(f"Unsupported columnar format: {format}")
+
+        self.pyarrow = import_pyarrow()
+        self.directory = directory
+        self.format = format
+        self.compression = compression if compression is not None else DEFAULT_COMPRESSION[format]
+        self.batch_size = batch_size
+
+        pa = self.pyarrow
+        types = {"string": pa.string(), "bool": pa.bool_(), "list": pa.list_(pa.string())}
+        self.schemas = {
+            table: pa.schema([(column, types[kind]) for column, kind in columns])
+            for table, columns in TABLES.items()
+        }
+        self.buffers = {table: [] for table in TABLES}
+        self.writers = {}
+        self.rows = {table: 0 for table in TABLES}
+
+    def paths(self):
+        """
+        Returns:
+            dict: table name -> path of its file.
+        """
+        extension = COLUMNAR_EXTENSIONS[self.format]
+        return {table: os.path.join(self.directory, f"{table}{extension}") for table in TABLES}
+
+    def _writer(self, table: str):
+        writer = self.writers.get(table)
+        if writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            partial_path = f"{self.paths()[table]}.partial"
+            if self.format == "parquet":
+                writer = self.pyarrow.parquet.ParquetWriter(partial_path, self.schemas[table], compression=self.compression or "none")
+            else:
+                options = self.pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+                writer = self.pyarrow.ipc.new_file(partial_path, self.schemas[table], options=options)
+            self.writers[table] = writer
+        return writer
+
+    def _flush(self, table: str):
+        rows = self.buffers[table]
+        columns = {
+            column: [_convert(row.get(column), kind) for row in rows]
+            for column, kind in TABLES[table]
+        }
+        batch = self.pyarrow.RecordBatch.from_pydict(columns, schema=self.schemas[table])
+        self._writer(table).write_batch(batch)
+        self.rows[table] += len(rows)
+        self.buffers[table] = []
+
+    def write(self, application: dict, service_principal: dict):
+        """
+        Add a collected application and its service principal to the tables.
+        """
+        for table, rows in flatten(application, service_principal).items():
+            self.buffers[table].extend(rows)
+            if len(self.buffers[table]) >= self.batch_size:
+                self._flush(table)
+
+    def close(self):
+        """
+        Write the buffered rows and move the files to their final paths (tables without rows are written empty).
+        """
+        paths = self.paths()
+        for table in TABLES:
+            self._flush(table)
+            self._writer(table).close()
+            os.replace(f"{paths[table]}.partial", paths[table])
+        self.writers = {}
+
+    def abort(self):
+        """
+        Stop the export, keeping the files of the previous export untouched (the partial files are kept for inspection).
+        """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def export_columnar(collected, directory: str = "data/columnar", format: str = "parquet", compression: str = None):
+    """
+    Export collected (application, service principal) pairs to columnar tables (see ColumnarExporter).
+
+    Args:
+        collected (iterable): (application dict, service principal dict) pairs, e.g. CollectionWriter.read().
+        directory (str): Directory of the table files.
+        format (str): 'parquet' or 'arrow'.
+        compression (str, optional): Compression codec, defaults to the default of the format.
+
+    Returns:
+        dict: table name -> (path, number of rows).
+    """
+    exporter = ColumnarExporter(directory, format=format, compression=compression)
+    try:
+        for application, service_principal in collected:
+            exporter.write(application, service_principal)
+    except BaseException:
+        exporter.abort()
+        raise
+    exporter.close()
+    return {table: (path, exporter.rows[table]) for table, path in exporter.paths().items()}
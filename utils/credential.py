@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+
+from azure.identity.aio import ClientSecretCredential
+
+
+logger = logging.getLogger(__name__)
+
+class CachedAsyncCredential:
+    """
+    Async credential (AsyncTokenCredential) with an in-memory token cache and proactive refresh.
+
+    Tokens are acquired with the async azure.identity ClientSecretCredential, so the event loop is never
+    blocked by a token request. Each token is cached per scopes and refreshed in the background
+    `refresh_margin` seconds before it expires: during a long sweep the requests always find a valid
+    token and never wait for its acquisition (only the very first request does).
+
+    Acquisitions are single-flight: concurrent requests that need a token share the same acquisition.
+    """
+
+    _shared = {}
+
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str, refresh_margin: float = 300.0):
+        """
+        Args:
+            tenant_id (str): Azure tenant ID.
+            client_id (str): Azure application (client) ID.
+            client_secret (str): Azure application client secret.
+            refresh_margin (float): Seconds before expiry at which a token is refreshed in the background.
+        """
+        self.credential = ClientSecretCredential(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)
+        self.refresh_margin = refresh_margin
+
+        self.tokens = {}        # scopes -> AccessToken
+        self.acquiring = {}     # scopes -> future of the acquisition in progress
+        self.refreshers = {}    # scopes -> background refresh task
+
+        # counters
+        self.acquisitions = 0           # tokens acquired from Entra ID
+        self.acquisition_time = 0.0     # total seconds spent acquiring tokens
+        self.max_acquisition_time = 0.0
+        self.background_refreshes = 0   # acquisitions made ahead of expiry, off the hot path
+        self.waits = 0                  # get_token calls that had to wait for an acquisition
+        self.cache_hits = 0
+
+    @classmethod
+    def shared(cls, tenant_id: str, client_id: str, client_secret: str, **kwargs):
+        """
+        Return the credential shared by all the clients of the process for the same app registration.
+        A closed credential is no longer shared: the next call creates a new one.
+        """
+        key = (tenant_id, client_id)
+        if key not in cls._shared:
+            cls._shared[key] = cls(tenant_id, client_id, client_secret, **kwargs)
+        return cls._shared[key]
+
+    async def get_token(self, *scopes, claims: str = None, **kwargs):
+        """
+        Return a valid access token for the scopes, from the cache whenever possible.
+        """
+        if claims:
+            # claims challenge (e.g. continuous access evaluation): a new token is needed
+            return await self._acquire(scopes, claims=claims, **kwargs)
+
+        token = self.tokens.get(scopes)
+        if token is not None and token.expires_on - time.time() > 30:
+            self.cache_hits += 1
+            return token
+
+        self.waits += 1
+        return await self._acquire(scopes, **kwargs)
+
+    async def _acquire(self, scopes: tuple, **kwargs):
+        future = self.acquiring.get(scopes)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(scopes, **kwargs))
+            self.acquiring[scopes] = future
+            future.add_done_callback(lambda _: self.acquiring.pop(scopes, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, scopes: tuple, **kwargs):
+        start = time.monotonic()
+        token = await self.credential.get_token(*scopes, **kwargs)
+        elapsed = time.monotonic() - start
+
+        self.acquisitions += 1
+        self.acquisition_time += elapsed
+        self.max_acquisition_time = max(self.max_acquisition_time, elapsed)
+
+        self.tokens[scopes] = token
+        # a claims challenge is answered once: the refreshed token is requested without it
+        kwargs.pop("claims", None)
+        self._schedule_refresh(scopes, token, **kwargs)
+        return token
+
+    def _schedule_refresh(self, scopes: tuple, token, **kwargs):
+        refresher = self.refreshers.get(scopes)
+        if refresher is not None and not refresher.done():
+            refresher.cancel()
+        delay = max(0.0, token.expires_on - time.time() - self.refresh_margin)
+        self.refreshers[scopes] = asyncio.ensure_future(self._refresh_later(scopes, delay, **kwargs))
+
+    async def _refresh_later(self, scopes: tuple, delay: float, **kwargs):
+        await asyncio.sleep(delay)
+        # the acquisition schedules the next refresh: this task must not be cancelled as the previous refresher
+        if self.refreshers.get(scopes) is asyncio.current_task():
+            del self.refreshers[scopes]
+        try:
+            await self._acquire(scopes, **kwargs)
+        except Exception as e:
+            # the cached token is still valid for refresh_margin seconds: the next get_token will retry
+            logger.warning("Background refresh of the access token for %s failed: %r", scopes, e)
+            return
+        self.background_refreshes += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: Token acquisition counters, to check that token acquisition stays off the hot path.
+        """
+        return {
+            "acquisitions": self.acquisitions,
+            "background_refreshes": self.background_refreshes,
+            "waits": self.waits,
+            "cache_hits": self.cache_hits,
+            "avg_acquisition_seconds": self.acquisition_time / self.acquisitions if self.acquisitions else 0.0,
+            "max_acquisition_seconds": self.max_acquisition_time,
+        }
+
+    async def close(self):
+        # the futures and refresh tasks of a closed credential belong to its event loop: never hand it out again
+        for key, credential in list(self._shared.items()):
+            if credential is self:
+                del self._shared[key]
+        for refresher in self.refreshers.values():
+            refresher.cancel()
+        self.refreshers = {}
+        await self.credential.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,104 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+# HTTP status codes returned by Microsoft Graph when a request is throttled
+THROTTLING_STATUS_CODES = (429, 503)
+
+
+class GraphThrottledError(Exception):
+    """
+    Raised when a Microsoft Graph request is still throttled (429/503) after all the retries.
+
+    It is kept separate from the other errors so that callers can tell "throttled, try again later"
+    apart from "the request really failed" (e.g. a template that cannot be instantiated).
+    """
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class GraphResponseError(Exception):
+    """
+    Raised when a request sent inside a JSON batch fails. It carries the status code and the Graph error code of
+    the response as the errors of the Graph SDK do, so get_status_code() and classify_error() handle both.
+    """
+
+    def __init__(self, message: str, status_code: int, code: str = None):
+        super().__init__(message)
+        self.response_status_code = status_code
+        self.code = code
+
+
+def get_status_code(error: Exception):
+    """
+    Return the HTTP status code carried by an exception raised by the Graph SDK, if any.
+    """
+    return getattr(error, "response_status_code", None)
+
+
+def get_response_header(error: Exception, name: str):
+    """
+    Return a response header (case-insensitive lookup) carried by an exception raised by the Graph SDK, if any.
+    """
+    headers = getattr(error, "response_headers", None) or {}
+    for key, value in dict(headers).items():
+        if key.lower() == name.lower():
+            # kiota may store header values as lists/sets of strings
+            if isinstance(value, (list, tuple, set)):
+                return next(iter(value), None)
+            return value
+    return None
+
+
+def parse_retry_after(value):
+    """
+    Parse the value of a Retry-After header, given either in seconds or as an HTTP date.
+
+    Returns:
+        float or None: Number of seconds to wait, or None if the value cannot be parsed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_throttling_error(error: Exception):
+    """
+    Return True if the exception is a throttled response from Microsoft Graph (429/503).
+    """
+    return isinstance(error, GraphThrottledError) or get_status_code(error) in THROTTLING_STATUS_CODES
+
+
+# HTTP status codes that will not change by retrying the same request later
+PERMANENT_STATUS_CODES = (400, 403, 404, 405, 409, 410, 422)
+
+
+def classify_error(error: Exception):
+    """
+    Describe a failed Graph request as an error class and tell whether retrying it later can help.
+
+    The error class is the HTTP status code followed by the Graph error code when available
+    (e.g. '400 Request_BadRequest'), or the exception type for errors without a response (e.g. timeouts).
+
+    Returns:
+        tuple: (error class, True if the error is permanent and False if it is transient).
+    """
+    status_code = get_status_code(error)
+    if status_code is None:
+        return type(error).__name__, False
+
+    # ODataError raised by the msgraph SDK carries the Graph error code in error.error.code
+    code = getattr(getattr(error, "error", None), "code", None) or getattr(error, "code", None)
+    error_class = f"{status_code} {code}" if code else str(status_code)
+    return error_class, status_code in PERMANENT_STATUS_CODES
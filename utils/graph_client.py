@@ -1,23 +1,111 @@
 import os
-from dotenv import load_dotenv
-from azure.identity import ClientSecretCredential
-from msgraph import GraphServiceClient
+import asyncio
+import json
+from urllib.parse import quote, urlencode, urlsplit
+from kiota_abstractions.authentication import AnonymousAuthenticationProvider
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
+from msgraph import GraphRequestAdapter, GraphServiceClient
 
 from kiota_abstractions.base_request_configuration import RequestConfiguration
+from kiota_abstractions.method import Method
+from kiota_abstractions.request_information import RequestInformation
 from msgraph.generated.application_templates.application_templates_request_builder import ApplicationTemplatesRequestBuilder
 from msgraph.generated.application_templates.item.instantiate.instantiate_post_request_body import InstantiatePostRequestBody
-
+from msgraph.generated.applications.applications_request_builder import ApplicationsRequestBuilder
+from msgraph.generated.models.application import Application
+from msgraph.generated.models.o_auth2_permission_grant import OAuth2PermissionGrant
+from msgraph.generated.models.o_data_errors.o_data_error import ODataError
+from msgraph.generated.models.service_principal import ServicePrincipal
+from msgraph.generated.oauth2_permission_grants.oauth2_permission_grants_request_builder import Oauth2PermissionGrantsRequestBuilder
+from msgraph.generated.service_principals.item.service_principal_item_request_builder import ServicePrincipalItemRequestBuilder
+from msgraph.generated.service_principals.service_principals_request_builder import ServicePrincipalsRequestBuilder
+from msgraph.generated.users.users_request_builder import UsersRequestBuilder
+
+from utils.async_cache import AsyncTTLCache
+from utils.batch import GraphBatcher
+from utils.catalog_cache import CatalogChanges, TemplateCatalogCache
+from utils.credential import CachedAsyncCredential
+from utils.errors import GraphResponseError, GraphThrottledError, get_status_code
+from utils.metrics import GraphMetrics, instrumented
+from utils.profiles import CredentialProfile
+from utils.rate_limit import RateLimiter
+from utils.records import to_record
+from utils.serializer import model_schema, to_serializable
+from utils.transport import GraphTransport
+
+
+# Layout of the SDK models: fields, defaults and nested models of the records read as JSON (see instantiate_application)
+APPLICATION_SCHEMA = model_schema(Application)
+SERVICE_PRINCIPAL_SCHEMA = model_schema(ServicePrincipal)
+OAUTH2_PERMISSION_GRANT_SCHEMA = model_schema(OAuth2PermissionGrant)
+
+
+def to_camel_case(field: str):
+    """
+    Convert a field name of the SDK models (e.g. 'display_name') to the name used by Graph in $select (e.g. 'displayName').
+    Names already in camelCase are returned unchanged.
+    """
+    head, *tail = field.strip().split("_")
+    return head + "".join(part[:1].upper() + part[1:] for part in tail)
+
+
+def to_snake_case(field: str):
+    """
+    Convert a Graph field name (e.g. 'displayName') to the attribute name of the SDK models (e.g. 'display_name').
+    """
+    return "".join(f"_{char.lower()}" if char.isupper() else char for char in field.strip())
+
+
+def select_from(obj, fields: list):
+    """
+    Build a dictionary with the given fields of an SDK model, keyed by the field names as passed by the caller.
+    """
+    return {field.strip(): getattr(obj, to_snake_case(field), None) for field in fields}
+
+
+def from_json(data: dict, name: str, select: list = None, schema=None):
+    """
+    Build the output dictionary of a Graph object read as JSON (e.g. the body of a batch response), with the same
+    keys and values as the SDK model of the object would give (see select_from() and to_serializable()).
+    """
+    record = to_record(data, name, select, schema=schema)
+    if select:
+        return {field.strip(): to_serializable(getattr(record, to_snake_case(field))) for field in select}
+    return to_serializable(record)
+
+
+def relative_url(url: str):
+    """
+    Convert an absolute Graph URL (e.g. an @odata.nextLink) to the URL relative to the version root used in JSON batches.
+    """
+    parts = urlsplit(url)
+    path = "/" + parts.path.lstrip("/").partition("/")[2]  # without the version segment (e.g. 'v1.0')
+    return f"{path}?{parts.query}" if parts.query else path
+
+
+def batch_error(response, method: str, url: str):
+    """
+    Build the error of a failed request sent inside a JSON batch.
+    """
+    error = (response.body or {}).get("error", {}) if isinstance(response.body, dict) else {}
+    return GraphResponseError(
+        f"Batch request {method} {url} failed with status {response.status}: {error.get('message', '')}",
+        status_code=response.status,
+        code=error.get("code"),
+    )
 
 
 class GraphClient:
 
-    def __init__(self):
+    def __init__(self, rate_limiter: RateLimiter = None, batch_size: int = 20, batch_wait: float = 0.05,
+                 catalog_cache: TemplateCatalogCache = None, transport: GraphTransport = None, profile: CredentialProfile = None,
+                 base_url: str = None, metrics: GraphMetrics = None, lookup_cache: AsyncTTLCache = None):
         """
         Initialize the GraphClient instance.
 
         Loads environment variables from a .env file, sets up Azure identity credentials
-        using ClientSecretCredential, and initializes the Microsoft GraphServiceClient
-        for making authenticated requests to the Microsoft Graph API.
+        using an async ClientSecretCredential (cached and refreshed ahead of expiry, see CachedAsyncCredential),
+        and initializes the Microsoft GraphServiceClient for making authenticated requests to the Microsoft Graph API.
 
         Environment variables required:
         - TENANT_ID: Azure tenant ID
@@ -26,24 +114,205 @@ class GraphClient:
 
         The client is configured with the default Microsoft Graph scopes:
         'https://graph.microsoft.com/.default'. (i.e., the scopes defined in the MS Entra ID App registration)
-        """
 
-        # Load environment variables from .env file
-        load_dotenv()
+        Args:
+            rate_limiter (RateLimiter, optional): Rate limiter applied to every request of the client
+                (token bucket, adaptive concurrency and retries of throttled requests).
+                Pass the same instance to several clients to share the limits. Defaults to a new RateLimiter.
+            batch_size (int, optional): Number of queued batched requests that triggers a JSON batch (at most 20).
+            batch_wait (float, optional): Seconds a batched request can wait for others before its batch is sent.
+            catalog_cache (TemplateCatalogCache, optional): On-disk cache of the application template catalog
+                used by list_application_template(). Defaults to None (the catalog is always downloaded).
+            transport (GraphTransport, optional): Pooled HTTP transport (connection limits, HTTP/2, keep-alive and
+                timeouts per operation type). Defaults to the transport shared by all the clients of the process.
+            profile (CredentialProfile, optional): Credentials of the app registration to use instead of the
+                environment variables above (e.g. one of the profiles of a sharded collection).
+            base_url (str, optional): Base URL of the Graph API. Defaults to the GRAPH_BASE_URL environment variable,
+                or https://graph.microsoft.com/v1.0. A local URL (e.g. the stand-in server of scripts/benchmarks/mock_graph.py)
+                is called without access tokens.
+            metrics (GraphMetrics, optional): Metrics of the calls of the client (latency, outcomes, errors, HTTP
+                requests...). Defaults to the metrics shared by all the clients of the process.
+            lookup_cache (AsyncTTLCache, optional): Cache of get_service_principal() and get_oauth2_permission_grants()
+                (LRU with TTL, concurrent lookups of the same object share one request). Pass the same instance to
+                several clients to share the cached objects. Defaults to a new AsyncTTLCache.
+
+        Raises:
+            ValueError: If no profile is given and the credentials are not defined in the environment.
+        """
 
-        # credentials for the GraphServiceClient
-        self.credential = ClientSecretCredential(
-            tenant_id=os.getenv("TENANT_ID"),
-            client_id=os.getenv("CLIENT_ID"),
-            client_secret=os.getenv("CLIENT_SECRET")
+        # credentials from the environment variables (.env file) unless a profile is given
+        profile = profile or CredentialProfile.require_env()
+        self.tenant_id = profile.tenant_id
+        self.profile_name = profile.name
+
+        # credentials for the GraphServiceClient: async (never blocks the event loop), shared by the clients
+        # of the same app registration, with the tokens refreshed in the background before they expire
+        self.credential = CachedAsyncCredential.shared(
+            tenant_id=self.tenant_id,
+            client_id=profile.client_id,
+            client_secret=profile.client_secret
         )
 
         # scopes for the GraphServiceClient
         self.scopes = ['https://graph.microsoft.com/.default']  # in this way we can use the default scopes: i.e. the scopes defined in the MS Entra ID App registration
 
+        # pooled HTTP transport, shared with the other clients: requests reuse warm connections
+        self.transport = transport or GraphTransport.shared()
+        base_url = base_url or os.getenv("GRAPH_BASE_URL")
+        if base_url and urlsplit(base_url).hostname in ("localhost", "127.0.0.1", "::1"):
+            # local stand-in server: no token is requested
+            auth_provider = AnonymousAuthenticationProvider()
+        else:
+            auth_provider = AzureIdentityAuthenticationProvider(self.credential, scopes=self.scopes)
+        self.request_adapter = GraphRequestAdapter(auth_provider, client=self.transport.http_client())
+        if base_url:
+            self.request_adapter.base_url = base_url.rstrip("/")
+
         # the client application to interact with Microsoft Graph API
-        self.client = GraphServiceClient(credentials=self.credential, scopes=self.scopes)
+        self.client = GraphServiceClient(request_adapter=self.request_adapter)
+
+        # shared by all the calls of the client: throttled requests (429/503) are retried here
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        # application template catalog cache (and changes detected by its last refresh)
+        self.catalog_cache = catalog_cache
+        self.catalog_changes = None
+
+        # groups the batched calls (e.g. delete_service_principal(..., batched=True)) into POST /$batch requests
+        self.batcher = GraphBatcher(
+            self._send_batch,
+            max_size=batch_size,
+            max_wait=batch_wait,
+            max_retries=self.rate_limiter.max_retries,
+            base_delay=self.rate_limiter.base_delay,
+            max_delay=self.rate_limiter.max_delay,
+            on_retry_after=self.rate_limiter.bucket.pause,
+        )
+
+        # per-object lookups (e.g. enrichment of many service principals): cached and single-flight
+        self.lookup_cache = lookup_cache if lookup_cache is not None else AsyncTTLCache()
+
+        # latency, outcomes and errors of every call, HTTP requests and bytes transferred
+        self.metrics = metrics or GraphMetrics.shared()
+        self.metrics.attach(self)
+
+    @instrumented("batch")
+    async def _send_batch(self, requests: list):
+        """
+        Send a JSON batch to Microsoft Graph (used by self.batcher).
+
+        HTTP method: POST
+        Endpoint: /$batch
+
+        Args:
+            requests (list of dict): The batch requests, each with 'id', 'method', 'url' and optionally 'headers' and 'body'.
+
+        Returns:
+            list of dict: The batch responses, each with 'id', 'status', 'headers' and 'body'.
+
+        Raises:
+            GraphThrottledError: If the whole batch is still throttled after all the retries.
+        """
+
+        def post():
+            request_info = RequestInformation(Method.POST, "{+baseurl}/$batch")
+            request_info.headers.try_add("Accept", "application/json")
+            request_info.headers.try_add("Content-Type", "application/json")
+            request_info.content = json.dumps({"requests": requests}).encode("utf-8")
+            return self.client.request_adapter.send_primitive_async(request_info, "bytes", None)
+
+        content = await self.rate_limiter.call(post, timeout=self.transport.timeout("batch"))
+        return json.loads(content).get("responses", []) if content else []
+
+    async def flush(self):
+        """
+        Send the batched calls still queued and wait for all of them to complete.
+        """
+        await self.batcher.flush()
+
+    async def _iter_pages(self, request_builder, request_configuration):
+        """
+        Iterate over all the pages of a collection, following @odata.nextLink.
+
+        While the caller processes the items of a page, the next page is already being fetched.
+
+        Args:
+            request_builder: Request builder of the collection (e.g. self.client.users).
+            request_configuration (RequestConfiguration): Query parameters of the first request.
+
+        Yields:
+            The objects of every page, in order.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
+        """
+
+        def fetch(next_link: str = None):
+            if next_link is None:
+                return asyncio.ensure_future(
+                    self.rate_limiter.call(
+                        lambda: request_builder.get(request_configuration=request_configuration),
+                        timeout=self.transport.timeout("list"),
+                    )
+                )
+            # the next link already carries the query parameters of the first request
+            return asyncio.ensure_future(self.rate_limiter.call(
+                lambda: request_builder.with_url(next_link).get(),
+                timeout=self.transport.timeout("list"),
+            ))
+
+        next_page = fetch()
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                if not page:
+                    return
+
+                # prefetch the next page before handing over the current one
+                if page.odata_next_link:
+                    next_page = fetch(page.odata_next_link)
+
+                for item in page.value or []:
+                    yield item
+        finally:
+            # the caller stopped early (or a page failed): do not leave the prefetch running
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    @instrumented("iter_users")
+    async def iter_users(self, select: list = None, page_size: int = 100):
+        """
+        Stream the users of Microsoft Entra page by page.
+
+        HTTP method: GET
+        Endpoint: /users?$select=...&$top=...
+
+        Args:
+            select (list, optional): List of fields to include in the output dictionaries, pushed to Graph as $select.
+                Defaults to ['id', 'displayName'].
+            page_size (int, optional): Number of users per page ($top). Defaults to 100.
+
+        Yields:
+            dict: A user with only the selected fields included.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
+        """
+
+        if select is None:
+            select = ["id", "displayName"]
+
+        query_params = UsersRequestBuilder.UsersRequestBuilderGetQueryParameters(
+            select=[to_camel_case(field) for field in select],
+            top=page_size,
+        )
+        request_configuration = RequestConfiguration(query_parameters=query_params)
+
+        async for user in self._iter_pages(self.client.users, request_configuration):
+            yield select_from(user, select)
 
+    @instrumented("get_users")
     async def get_users(self, select_fields: list = None):
         """
         Retrieve a list of users from Microsoft Entra.
@@ -57,158 +326,400 @@ class GraphClient:
 
         Returns:
             list of dict: List of users with only the selected fields included.
-        """
 
-        if select_fields is None:
-            select_fields = ["id", "displayName"]
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
+        """
 
         try:
-            # Simple GET request without query parameters
-            result = await self.client.users.get()
-
-            # Return only selected fields (post-filtering)
-            return [
-                {
-                    field.strip(): getattr(user, field.strip(), None)
-                    for field in select_fields
-                }
-                for user in result.value
-            ] if result and result.value else []
+            # Follows every page: see iter_users
+            return [user async for user in self.iter_users(select=select_fields)]
+        except GraphThrottledError:
+            raise
         except Exception as e:
+            self.metrics.record_error("get_users", e)
             print(f"Error retrieving users: {e}")
             return []
 
-    async def list_application_template(self, select_fields: list = None):
+    @instrumented("iter_application_templates")
+    async def iter_application_templates(self, select: list = None, page_size: int = 100):
+        """
+        Stream the application templates of the Microsoft Entra App Gallery page by page.
+
+        HTTP method: GET
+        Endpoint: /applicationTemplates?$select=...&$top=...
+
+        Args:
+            select (list, optional): List of fields to include in the output dictionaries, pushed to Graph as $select.
+                Defaults to ['id', 'display_name'].
+            page_size (int, optional): Number of templates per page ($top). Defaults to 100.
+
+        Yields:
+            dict: An application template with only the selected fields included.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
+        """
+
+        if select is None:
+            select = ["id", "display_name"]
+
+        query_params = ApplicationTemplatesRequestBuilder.ApplicationTemplatesRequestBuilderGetQueryParameters(
+            select=[to_camel_case(field) for field in select],
+            top=page_size,
+        )
+        request_configuration = RequestConfiguration(query_parameters=query_params)
+
+        async for template in self._iter_pages(self.client.application_templates, request_configuration):
+            yield select_from(template, select)
+
+    @instrumented("list_application_template")
+    async def list_application_template(self, select_fields: list = None, refresh: bool = False):
         """
         Retrieve the list of available application templates from Microsoft Entra App Gallery.
 
         HTTP method: GET
         Endpoint: /applicationTemplates
 
+        With a catalog cache, a fresh cached catalog (same tenant and fields) is returned without any request.
+        Otherwise the catalog is downloaded and cached, and `self.catalog_changes` reports the templates
+        added, removed and changed since the cached version.
+
         Args:
             select_fields (list, optional): List of fields to include in the output dictionaries.
                 Defaults to ['id', 'display_name'].
+            refresh (bool, optional): If True, download the catalog even if the cached one is still fresh.
 
         Returns:
             list of dict: List of application templates with only the selected fields included.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
         """
 
         if select_fields is None:
             select_fields = ["id", "display_name"]
 
-        try:
-            # Simple GET request without query parameters
-            result = await self.client.application_templates.get()
-
-
-            #print(f"DEBUG: {result.value[0]}") # Debugging line to inspect the first template object
+        if self.catalog_cache is not None and not refresh:
+            entry = self.catalog_cache.load(self.tenant_id, select_fields)
+            if self.catalog_cache.is_fresh(entry):
+                self.catalog_changes = CatalogChanges()
+                return entry["templates"]
 
-            # Return only selected fields (post-filtering)
-            return [
-                {
-                    field.strip(): getattr(template, field.strip(), None)
-                    for field in select_fields
-                }
-                for template in result.value
-            ] if result and result.value else []
+        try:
+            # Follows every page: see iter_application_templates
+            templates = [template async for template in self.iter_application_templates(select=select_fields)]
+        except GraphThrottledError:
+            raise
         except Exception as e:
+            self.metrics.record_error("list_application_template", e)
             print(f"Error retrieving application templates: {e}")
             return []
 
-    async def instantiate_application(self, template_id: str, display_name: str, select_fields_sp: list = None, select_fields_app: list = None):
+        if self.catalog_cache is not None and templates:
+            self.catalog_changes = self.catalog_cache.store(self.tenant_id, select_fields, templates)
+        return templates
+
+    @instrumented("iter_applications")
+    async def iter_applications(self, select: list = None, filter: str = None, page_size: int = 100):
+        """
+        Stream the application objects (app registrations) of the tenant page by page.
+
+        HTTP method: GET
+        Endpoint: /applications?$select=...&$filter=...&$top=...
+
+        Args:
+            select (list, optional): List of fields to include in the output dictionaries, pushed to Graph as $select.
+                Defaults to ['id', 'app_id', 'display_name'].
+            filter (str, optional): OData filter, e.g. "startswith(displayName,'[collect] ')".
+            page_size (int, optional): Number of applications per page ($top). Defaults to 100.
+
+        Yields:
+            dict: An application with only the selected fields included.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
+        """
+
+        if select is None:
+            select = ["id", "app_id", "display_name"]
+
+        query_params = ApplicationsRequestBuilder.ApplicationsRequestBuilderGetQueryParameters(
+            select=[to_camel_case(field) for field in select],
+            filter=filter,
+            top=page_size,
+        )
+        request_configuration = RequestConfiguration(query_parameters=query_params)
+
+        async for application in self._iter_pages(self.client.applications, request_configuration):
+            yield select_from(application, select)
+
+    @instrumented("iter_service_principals")
+    async def iter_service_principals(self, select: list = None, filter: str = None, page_size: int = 100):
+        """
+        Stream the service principals of the tenant page by page.
+
+        HTTP method: GET
+        Endpoint: /servicePrincipals?$select=...&$filter=...&$top=...
+
+        Args:
+            select (list, optional): List of fields to include in the output dictionaries, pushed to Graph as $select.
+                Defaults to ['id', 'app_id', 'display_name'].
+            filter (str, optional): OData filter, e.g. "startswith(displayName,'[collect] ')".
+            page_size (int, optional): Number of service principals per page ($top). Defaults to 100.
+
+        Yields:
+            dict: A service principal with only the selected fields included.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
+        """
+
+        if select is None:
+            select = ["id", "app_id", "display_name"]
+
+        query_params = ServicePrincipalsRequestBuilder.ServicePrincipalsRequestBuilderGetQueryParameters(
+            select=[to_camel_case(field) for field in select],
+            filter=filter,
+            top=page_size,
+        )
+        request_configuration = RequestConfiguration(query_parameters=query_params)
+
+        async for service_principal in self._iter_pages(self.client.service_principals, request_configuration):
+            yield select_from(service_principal, select)
+
+    @instrumented("instantiate_application")
+    async def instantiate_application(self, template_id: str, display_name: str, select_fields_sp: list = None, select_fields_app: list = None,
+                                      raise_errors: bool = False):
         """
         Instantiate a new application from a given application template in Microsoft Entra.
 
         HTTP method: POST
         Endpoint: /applicationTemplates/{template_id}/instantiate
 
+        The response is parsed straight into slotted records (see utils.records) holding only the selected fields:
+        the SDK model graphs of the application and of the service principal are never built. Whole objects keep the
+        fields of the SDK models (missing ones are None, unknown ones in additional_data) and datetimes are parsed,
+        so they are serialized as the models were.
+
         Args:
             template_id (str): The ID of the application template to instantiate.
             display_name (str): The display name to assign to the new application.
             select_fields_sp (list, optional): List of fields to include from the servicePrincipal object.
-                If None, returns the whole object.
+                If None, returns the whole object. The object ID is always included (it is needed to delete the object).
             select_fields_app (list, optional): List of fields to include from the application object.
-                If None, returns the whole object.
+                If None, returns the whole object. The object ID is always included.
+            raise_errors (bool, optional): If True, the error of a failed request is raised instead of returning None
+                (e.g. to record why the template cannot be instantiated, see utils.errors.classify_error).
 
         Returns:
-            dict or None: A dictionary containing filtered 'servicePrincipal' and 'application' objects
+            dict or None: A dictionary containing the 'servicePrincipal' and 'application' records
                 with only the selected fields, or None if instantiation fails.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries
+                (i.e. the template was not instantiated, but it is not known whether it can be).
+            Exception: With raise_errors, the error raised by the failed request.
         """
 
         try:
             request_body = InstantiatePostRequestBody(
                 display_name=display_name,
             )
-            result = await self.client.application_templates.by_application_template_id(template_id).instantiate.post(request_body)
+            instantiate = self.client.application_templates.by_application_template_id(template_id).instantiate
 
-            if not result:
+            def post():
+                # raw response: parsed below into records instead of SDK models
+                request_info = instantiate.to_post_request_information(request_body)
+                return self.client.request_adapter.send_primitive_async(request_info, "bytes", {"XXX": ODataError})
+
+            content = await self.rate_limiter.call(post, timeout=self.transport.timeout("instantiate"))
+            if not content:
                 return None
 
             # Important Note: The result is a complete object with both application and servicePrincipal objects of the instantiated application.
             # So we can directly access all information from the result (e.g. delegatedPermissions from oauth2PermissionScopes in the servicePrincipal object).
-            # Return only selected fields (post-filtering)
-
-            # Extract ServicePrincipal object from the result
-            servicePrincipal = result.service_principal
-            # Extract Application object from the result
-            application = result.application
+            result = json.loads(content)
+            service_principal = result.get("servicePrincipal")
+            application = result.get("application")
 
-            if not servicePrincipal or not application:
+            if not service_principal or not application:
                 return None
-            
-            # convert to dictionary if they are not already
-            if not isinstance(servicePrincipal, dict):
-                servicePrincipal = servicePrincipal.to_dict() if hasattr(servicePrincipal, 'to_dict') else servicePrincipal
-            if not isinstance(application, dict):
-                application = application.to_dict() if hasattr(application, 'to_dict') else application
-            
-            # Filter only selected fields from the servicePrincipal and application objects
-            # filter function to filter fields from the servicePrincipal and application objects
-            def filter_fields(obj: dict, fields: list):
-                return {field.strip(): obj.get(field.strip()) for field in fields} if fields else obj # if fields is empty, return the whole object
-            
-
-            # If fields are specified, filter the objects otherwise return the whole object
+
+            # Keep only the selected fields (plus the object IDs): the rest of the parsed response is released here.
+            # The whole objects keep the layout of the SDK models (fields, defaults, nested models), so their output does not change.
             return {
-                "servicePrincipal": filter_fields(servicePrincipal, select_fields_sp),
-                "application": filter_fields(application, select_fields_app)
+                "servicePrincipal": to_record(service_principal, "ServicePrincipal", ["id", *select_fields_sp] if select_fields_sp else None,
+                                              schema=SERVICE_PRINCIPAL_SCHEMA),
+                "application": to_record(application, "Application", ["id", *select_fields_app] if select_fields_app else None,
+                                         schema=APPLICATION_SCHEMA),
             }
 
+        except GraphThrottledError:
+            raise
         except Exception as e:
-            #print(f"DEBUG: Error instantiating application from template {template_id}: {e}") 
+            if raise_errors:
+                raise
+            # the error is not raised: count it here (raised errors are counted by @instrumented)
+            self.metrics.record_error("instantiate_application", e)
             return None
 
-    async def get_service_principal(self, service_principal_id: str):
+    @instrumented("get_service_principal")
+    async def get_service_principal(self, service_principal_id: str, select: list = None, expand: list = None, use_cache: bool = True,
+                                    batched: bool = False):
         """
         Retrieve detailed information about a specific Service Principal by its ID.
 
         HTTP method: GET
-        Endpoint: /servicePrincipals/{service_principal_id}
+        Endpoint: /servicePrincipals/{service_principal_id}?$select=...&$expand=...
+
+        Lookups go through self.lookup_cache: a service principal already retrieved (with the same fields) is
+        returned without a request until its entry expires, and concurrent lookups of the same service principal
+        share one request. The returned dictionary is shared with the cache and must not be modified.
 
         Args:
             service_principal_id (str): The unique identifier of the Service Principal.
+            select (list, optional): List of fields to retrieve, pushed to Graph as $select. If None, returns the whole object.
+            expand (list, optional): Relationships to retrieve in the same request, pushed to Graph as $expand
+                (e.g. ['app_role_assigned_to']). They are included in the output under the names passed.
+            use_cache (bool, optional): If False, the service principal is retrieved again, without joining
+                a lookup already in progress, and the cached entry replaced.
+            batched (bool, optional): If True, the request is sent inside a JSON batch together with other batched calls
+                (e.g. many lookups started at once). The output is the same.
 
         Returns:
             dict or None: The Service Principal object as a dictionary if found, else None.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
         """
-        pass
 
-    async def get_oauth2_permission_grants(self, service_principal_id: str):
+        fields = tuple(select or ()) + tuple(expand or ())
+        key = ("service_principal", service_principal_id, tuple(select or ()), tuple(expand or ()))
+
+        async def load_batched():
+            query = {}
+            if select:
+                query["$select"] = ",".join(to_camel_case(field) for field in select)
+            if expand:
+                query["$expand"] = ",".join(to_camel_case(field) for field in expand)
+            url = f"/servicePrincipals/{service_principal_id}"
+            if query:
+                url += "?" + urlencode(query, quote_via=quote, safe="$,")
+            response = await self.batcher.submit("GET", url)
+            if response.status == 404:
+                return None  # cached as well: the service principal does not exist
+            if not response.ok:
+                raise batch_error(response, "GET", url)
+            return from_json(response.body, "ServicePrincipal", list(fields) if select else None, schema=SERVICE_PRINCIPAL_SCHEMA)
+
+        async def load():
+            if batched:
+                return await load_batched()
+            query_params = ServicePrincipalItemRequestBuilder.ServicePrincipalItemRequestBuilderGetQueryParameters(
+                select=[to_camel_case(field) for field in select] if select else None,
+                expand=[to_camel_case(field) for field in expand] if expand else None,
+            )
+            request_configuration = RequestConfiguration(query_parameters=query_params)
+            service_principal = self.client.service_principals.by_service_principal_id(service_principal_id)
+            try:
+                result = await self.rate_limiter.call(
+                    lambda: service_principal.get(request_configuration=request_configuration),
+                    timeout=self.transport.timeout("get"),
+                )
+            except Exception as e:
+                if get_status_code(e) == 404:
+                    return None  # cached as well: the service principal does not exist
+                raise
+            if result is None:
+                return None
+            return to_serializable(select_from(result, fields) if select else result)
+
+        try:
+            return await self.lookup_cache.get_or_load(key, load, refresh=not use_cache)
+        except GraphThrottledError:
+            raise
+        except Exception as e:
+            self.metrics.record_error("get_service_principal", e)
+            return None
+
+    @instrumented("get_oauth2_permission_grants")
+    async def get_oauth2_permission_grants(self, service_principal_id: str, select: list = None, as_resource: bool = False,
+                                           page_size: int = 100, use_cache: bool = True, batched: bool = False):
         """
-        Retrieve the OAuth2 permission grants associated with a specific Service Principal.
+        Retrieve the OAuth2 permission grants (delegated permissions consented) associated with a specific Service Principal.
 
         HTTP method: GET
-        Endpoint: /oauth2PermissionGrants
+        Endpoint: /oauth2PermissionGrants?$filter=clientId eq '{service_principal_id}'&$select=...&$top=...
+
+        Every page is followed. As get_service_principal(), lookups are cached and single-flight
+        (see self.lookup_cache); the returned list is shared with the cache and must not be modified.
 
         Args:
             service_principal_id (str): The unique identifier of the Service Principal.
+            select (list, optional): List of fields to include in the output dictionaries, pushed to Graph as $select.
+                If None, returns the whole objects.
+            as_resource (bool, optional): If True, return the grants of permissions exposed by the Service Principal
+                ($filter=resourceId eq ...) instead of the grants made to it as a client.
+            page_size (int, optional): Number of grants per page ($top). Defaults to 100.
+            use_cache (bool, optional): If False, the grants are retrieved again, without joining
+                a lookup already in progress, and the cached entry replaced.
+            batched (bool, optional): If True, every page is requested inside a JSON batch together with other batched
+                calls. The output is the same.
 
         Returns:
-            list or None: A list of OAuth2 permission grant objects if any exist, else None.
+            list or None: A list of OAuth2 permission grant dictionaries (empty if there are none), or None if the request fails.
+
+        Raises:
+            GraphThrottledError: If a page is still throttled after all the retries.
         """
-        pass
 
-    async def delete_service_principal(self, service_principal_id: str):
+        key = ("oauth2_permission_grants", service_principal_id, tuple(select or ()), as_resource)
+
+        property_name = "resourceId" if as_resource else "clientId"
+
+        async def load_batched():
+            query = {"$filter": f"{property_name} eq '{service_principal_id}'", "$top": page_size}
+            if select:
+                query["$select"] = ",".join(to_camel_case(field) for field in select)
+            url = "/oauth2PermissionGrants?" + urlencode(query, quote_via=quote, safe="$,'")
+            grants = []
+            while url:
+                response = await self.batcher.submit("GET", url)
+                if not response.ok:
+                    raise batch_error(response, "GET", url)
+                grants.extend(
+                    from_json(grant, "OAuth2PermissionGrant", select, schema=OAUTH2_PERMISSION_GRANT_SCHEMA)
+                    for grant in response.body.get("value", [])
+                )
+                next_link = response.body.get("@odata.nextLink")
+                url = relative_url(next_link) if next_link else None
+            return grants
+
+        async def load():
+            if batched:
+                return await load_batched()
+            query_params = Oauth2PermissionGrantsRequestBuilder.Oauth2PermissionGrantsRequestBuilderGetQueryParameters(
+                select=[to_camel_case(field) for field in select] if select else None,
+                filter=f"{property_name} eq '{service_principal_id}'",
+                top=page_size,
+            )
+            request_configuration = RequestConfiguration(query_parameters=query_params)
+            return [
+                to_serializable(select_from(grant, select) if select else grant)
+                async for grant in self._iter_pages(self.client.oauth2_permission_grants, request_configuration)
+            ]
+
+        try:
+            return await self.lookup_cache.get_or_load(key, load, refresh=not use_cache)
+        except GraphThrottledError:
+            raise
+        except Exception as e:
+            self.metrics.record_error("get_oauth2_permission_grants", e)
+            return None
+
+    @instrumented("delete_service_principal")
+    async def delete_service_principal(self, service_principal_id: str, batched: bool = False):
         """
         Delete a specific Service Principal by its ID.
 
@@ -217,14 +728,66 @@ class GraphClient:
 
         Args:
             service_principal_id (str): The unique identifier of the Service Principal to delete.
+            batched (bool, optional): If True, the request is sent inside a JSON batch together with other batched calls.
 
         Returns:
-            bool: True if deletion was successful, False otherwise.
+            bool: True if deletion was successful (or the Service Principal does not exist anymore), False otherwise.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
+        """
+
+        try:
+            if batched:
+                response = await self.batcher.submit("DELETE", f"/servicePrincipals/{service_principal_id}")
+                if not response.ok and response.status != 404:
+                    self.metrics.record_error("delete_service_principal", error_class=str(response.status))
+                return response.ok or response.status == 404
+
+            service_principal = self.client.service_principals.by_service_principal_id(service_principal_id)
+            await self.rate_limiter.call(lambda: service_principal.delete(), timeout=self.transport.timeout("delete"))
+            return True
+        except GraphThrottledError:
+            raise
+        except Exception as e:
+            if get_status_code(e) == 404:
+                return True  # already deleted
+            self.metrics.record_error("delete_service_principal", e)
+            return False
+
+    @instrumented("delete_application")
+    async def delete_application(self, application_id: str, batched: bool = False):
+        """
+        Delete a specific Application object by its (object) ID.
+
+        HTTP method: DELETE
+        Endpoint: /applications/{application_id}
+
+        Args:
+            application_id (str): The object ID of the Application to delete (not its appId).
+            batched (bool, optional): If True, the request is sent inside a JSON batch together with other batched calls.
+
+        Returns:
+            bool: True if deletion was successful (or the Application does not exist anymore), False otherwise.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
         """
 
         try:
-            await self.client.service_principals.by_service_principal_id(service_principal_id).delete()
+            if batched:
+                response = await self.batcher.submit("DELETE", f"/applications/{application_id}")
+                if not response.ok and response.status != 404:
+                    self.metrics.record_error("delete_application", error_class=str(response.status))
+                return response.ok or response.status == 404
+
+            application = self.client.applications.by_application_id(application_id)
+            await self.rate_limiter.call(lambda: application.delete(), timeout=self.transport.timeout("delete"))
             return True
+        except GraphThrottledError:
+            raise
         except Exception as e:
-            #print(f"DEBUG: Error deleting Service Principal {service_principal_id}: {e}")
+            if get_status_code(e) == 404:
+                return True  # already deleted
+            self.metrics.record_error("delete_application", e)
             return False
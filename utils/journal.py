@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import time
+
+
+# States of a template in a collection run
+PENDING = "pending"             # not processed yet (or throttled: to be retried)
+INSTANTIATED = "instantiated"   # application and service principal created, data not saved yet
+COLLECTED = "collected"         # data saved in the journal, service principal still to delete
+DELETED = "deleted"             # data saved and service principal deleted: nothing left to do
+FAILED = "failed"               # the template cannot be instantiated: nothing left to do
+
+FINISHED_STATES = (DELETED, FAILED)
+
+
+class CollectionJournal:
+    """
+    Crash-safe journal of a collection run, stored in a SQLite database.
+
+    Every template goes through the states pending -> instantiated -> collected -> deleted (or failed),
+    and every transition is committed right away, together with the collected data. After an interruption
+    the run can be resumed: finished templates are skipped, the collected data is read back from the journal
+    and the objects left behind by half-done templates can still be cleaned up.
+    """
+
+    def __init__(self, path: str = "data/collect_journal.sqlite"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS templates (
+                template_id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                display_name TEXT,
+                state TEXT NOT NULL,
+                service_principal_id TEXT,
+                application_id TEXT,
+                application TEXT,
+                service_principal TEXT,
+                error TEXT,
+                fingerprint TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # journals written before the template fingerprints were recorded
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(templates)")}
+        if "fingerprint" not in columns:
+            self.connection.execute("ALTER TABLE templates ADD COLUMN fingerprint TEXT")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def reset(self):
+        """
+        Forget every template of the previous runs (i.e. start a new run from scratch).
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM templates")
+
+    def register(self, templates: list, fingerprints: dict = None):
+        """
+        Add the templates of the run as pending, keeping the state of the templates already in the journal.
+
+        Args:
+            templates (list of dict): Templates with 'id' and 'display_name', in collection order.
+            fingerprints (dict, optional): template ID -> fingerprint of the template metadata.
+        """
+        fingerprints = fingerprints or {}
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO templates (template_id, position, display_name, state, fingerprint, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (template_id) DO UPDATE SET
+                    position = excluded.position,
+                    display_name = excluded.display_name,
+                    fingerprint = COALESCE(excluded.fingerprint, fingerprint)
+                """,
+                [
+                    (template.get("id"), i, template.get("display_name"), PENDING, fingerprints.get(template.get("id")), now)
+                    for i, template in enumerate(templates)
+                ],
+            )
+
+    def sync_catalog(self, templates: list, fingerprints: dict):
+        """
+        Compare the current template catalog with the templates of the previous runs (incremental collection).
+
+        Templates whose metadata changed go back to pending (their previous data is dropped) and templates
+        no longer in the catalog are removed, so that their data is not part of the output anymore.
+        New templates are added as pending by register().
+
+        Args:
+            templates (list of dict): Current templates with 'id'.
+            fingerprints (dict): template ID -> fingerprint of the current template metadata.
+
+        Returns:
+            tuple: (new template IDs, changed template IDs, removed template IDs).
+        """
+        previous = dict(self.connection.execute("SELECT template_id, fingerprint FROM templates"))
+        current = {template.get("id") for template in templates}
+
+        added = [template_id for template_id in current if template_id not in previous]
+        changed = [
+            template_id for template_id in current
+            if previous.get(template_id) is not None and fingerprints.get(template_id) not in (None, previous[template_id])
+        ]
+        removed = [template_id for template_id in previous if template_id not in current]
+
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE templates SET state = ?, application = NULL, service_principal = NULL, error = NULL, "
+                "updated_at = ? WHERE template_id = ?",
+                [(PENDING, now, template_id) for template_id in changed],
+            )
+            self.connection.executemany("DELETE FROM templates WHERE template_id = ?", [(template_id,) for template_id in removed])
+
+        return added, changed, removed
+
+    def states(self):
+        """
+        Returns:
+            dict: template ID -> state.
+        """
+        return dict(self.connection.execute("SELECT template_id, state FROM templates"))
+
+    def _update(self, template_id: str, state: str, **fields):
+        assignments = "".join(f", {name} = ?" for name in fields)
+        with self.connection:
+            self.connection.execute(
+                f"UPDATE templates SET state = ?, updated_at = ?{assignments} WHERE template_id = ?",
+                (state, time.time(), *fields.values(), template_id),
+            )
+
+    def mark_pending(self, template_id: str):
+        self._update(template_id, PENDING, service_principal_id=None, application_id=None)
+
+    def mark_instantiated(self, template_id: str, service_principal_id: str, application_id: str = None):
+        self._update(template_id, INSTANTIATED, service_principal_id=service_principal_id, application_id=application_id)
+
+    def mark_collected(self, template_id: str, application: dict, service_principal: dict):
+        self._update(
+            template_id, COLLECTED,
+            application=json.dumps(application, ensure_ascii=False),
+            service_principal=json.dumps(service_principal, ensure_ascii=False),
+        )
+
+    def mark_deleted(self, template_id: str):
+        """
+        Record that the objects of a collected template were deleted. Only a template whose data is saved is
+        updated: a template reset to pending (e.g. a new run, or changed metadata) keeps its state.
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE templates SET state = ?, updated_at = ? WHERE template_id = ? AND state = ?",
+                (DELETED, time.time(), template_id, COLLECTED),
+            )
+
+    def mark_failed(self, template_id: str, error: str = None):
+        self._update(template_id, FAILED, error=error)
+
+    def leftovers(self):
+        """
+        Return the templates whose service principal was created but not deleted.
+
+        Returns:
+            list of tuple: (template_id, state, service_principal_id, application_id), in collection order.
+        """
+        return self.connection.execute(
+            "SELECT template_id, state, service_principal_id, application_id FROM templates "
+            "WHERE state IN (?, ?) AND service_principal_id IS NOT NULL ORDER BY position",
+            (INSTANTIATED, COLLECTED),
+        ).fetchall()
+
+    def collected_count(self):
+        """
+        Returns:
+            int: Number of templates whose data was collected.
+        """
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM templates WHERE state IN (?, ?) AND application IS NOT NULL",
+            (COLLECTED, DELETED),
+        ).fetchone()[0]
+
+    def collected(self, with_template_ids: bool = False):
+        """
+        Iterate over the collected data, in collection order.
+
+        Args:
+            with_template_ids (bool): If True, the template ID is yielded in front of the data.
+
+        Yields:
+            tuple: (application dict, service principal dict), or (template ID, application dict, service principal dict).
+        """
+        cursor = self.connection.execute(
+            "SELECT template_id, application, service_principal FROM templates "
+            "WHERE state IN (?, ?) AND application IS NOT NULL ORDER BY position",
+            (COLLECTED, DELETED),
+        )
+        for template_id, application, service_principal in cursor:
+            if with_template_ids:
+                yield template_id, json.loads(application), json.loads(service_principal)
+            else:
+                yield json.loads(application), json.loads(service_principal)
@@ -0,0 +1,458 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import time
+import weakref
+from contextlib import contextmanager
+
+import httpx
+
+from utils.errors import GraphThrottledError, classify_error
+
+
+logger = logging.getLogger(__name__)
+
+# Innermost GraphClient call measured by GraphMetrics.track in the current task
+_current_call = contextvars.ContextVar("graph_metrics_call", default=None)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def format_labels(labels: dict):
+    """
+    Format the labels of a sample in the Prometheus text format, e.g. {operation="delete",outcome="ok"}.
+    """
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter with labels (e.g. requests per operation and status).
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}    # label values -> value
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        """
+        Yields:
+            tuple: (sample name, labels dict, value).
+        """
+        for key, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.labels, key)), value
+
+    def summary(self):
+        return [{"labels": labels, "value": value} for _, labels, value in self.samples()]
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down (e.g. requests in flight).
+    """
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Counter):
+    """
+    Distribution of observed values (e.g. latencies) in cumulative buckets, as in Prometheus.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0, "max": 0.0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][i] += 1
+                break
+        series["count"] += 1
+        series["sum"] += value
+        series["max"] = max(series["max"], value)
+
+    def quantile(self, q: float, **labels):
+        """
+        Estimate a quantile from the buckets (linear interpolation inside the bucket).
+        """
+        return self._quantile(self.values.get(self._key(labels)), q)
+
+    def _quantile(self, series: dict, q: float):
+        if not series or not series["count"]:
+            return 0.0
+        rank = q * series["count"]
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, series["buckets"]):
+            if count and cumulative + count >= rank:
+                return min(series["max"], lower + (bound - lower) * (rank - cumulative) / count)
+            cumulative += count
+            lower = bound
+        return series["max"]
+
+    def samples(self):
+        for key, series in sorted(self.values.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": f"{bound:g}"}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, series["count"]
+            yield f"{self.name}_sum", labels, series["sum"]
+            yield f"{self.name}_count", labels, series["count"]
+
+    def summary(self):
+        return [
+            {
+                "labels": dict(zip(self.labels, key)),
+                "count": series["count"],
+                "avg": series["sum"] / series["count"] if series["count"] else 0.0,
+                "p50": self._quantile(series, 0.50),
+                "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99),
+                "max": series["max"],
+            }
+            for key, series in sorted(self.values.items())
+        ]
+
+
+class MetricsRegistry:
+    """
+    Set of metrics exportable as Prometheus text (exposition format 0.0.4) or as a JSON summary.
+
+    Besides the metrics updated as events happen, collectors (functions returning metrics) are evaluated
+    at export time, e.g. to read the counters kept by other components.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()):
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector):
+        """
+        Args:
+            collector (callable): Returns the list of the metrics to export (Counter or Gauge objects).
+        """
+        self.collectors.append(collector)
+
+    def collect(self):
+        metrics = list(self.metrics.values())
+        for collector in self.collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def to_prometheus(self):
+        """
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                value = "+Inf" if value == math.inf else repr(value)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Returns:
+            dict: metric name -> list of series (labels and value, or count, average and quantiles for histograms).
+        """
+        return {metric.name: metric.summary() for metric in self.collect()}
+
+    def save(self, path: str):
+        """
+        Write the metrics to a file: JSON summary if the path ends with .json, Prometheus text otherwise.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            if path.endswith(".json"):
+                json.dump(self.summary(), metrics_file, indent=2)
+            else:
+                metrics_file.write(self.to_prometheus())
+
+
+class CountingStream(httpx.AsyncByteStream):
+    """
+    Response stream counting the bytes received (before decompression) as they are read.
+    """
+
+    def __init__(self, stream, on_bytes):
+        self.stream = stream
+        self.on_bytes = on_bytes
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.on_bytes(len(chunk))
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class GraphMetrics(MetricsRegistry):
+    """
+    Metrics of the GraphClient calls, shared by default by all the clients of the process:
+
+    - per GraphClient method: calls by outcome, latency histogram, calls in flight and errors by error class
+      (including the errors that the methods handle, e.g. a template that cannot be instantiated)
+    - per HTTP request (httpx event hooks): requests by method and status, latency to the response headers
+      and bytes sent and received
+    - read from the clients at export time: rate limiter requests, throttled responses (i.e. retries) and current
+      concurrency limit (per credential profile), JSON batches, and token acquisitions
+    """
+
+    _shared = None
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__()
+        self.calls = self.counter("graph_client_calls_total", "GraphClient calls by method and outcome.", ("operation", "outcome"))
+        self.call_duration = self.histogram("graph_client_call_duration_seconds", "Duration of the GraphClient calls.", ("operation",), buckets)
+        self.in_flight = self.gauge("graph_client_calls_in_flight", "GraphClient calls in progress.", ("operation",))
+        self.errors = self.counter("graph_client_errors_total", "Errors of the GraphClient calls by error class.", ("operation", "error_class"))
+
+        self.http_requests = self.counter("graph_http_requests_total", "HTTP requests by method and status code.", ("method", "status"))
+        self.http_duration = self.histogram("graph_http_request_duration_seconds", "Time to the response headers of the HTTP requests.", ("method",), buckets)
+        self.http_sent = self.counter("graph_http_request_bytes_total", "Bytes of the HTTP request bodies.", ("method",))
+        self.http_received = self.counter("graph_http_response_bytes_total", "Bytes of the HTTP response bodies (on the wire).", ("method",))
+
+        self.clients = weakref.WeakSet()
+        self.instrumented = weakref.WeakSet()   # httpx clients with the event hooks
+        self.started = weakref.WeakKeyDictionary()  # httpx request -> start time
+        self.add_collector(self._collect_clients)
+
+    @classmethod
+    def shared(cls):
+        """
+        Return the metrics shared by default by all the GraphClient instances of the process.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @contextmanager
+    def track(self, operation: str):
+        """
+        Measure a GraphClient call: duration, outcome, in-flight gauge and error class.
+        """
+        self.in_flight.inc(operation=operation)
+        start = time.monotonic()
+        outcome = "ok"
+        call = _TrackedCall(operation, _current_call.get())
+        _current_call.set(call)
+        try:
+            yield
+            if call.failed:
+                outcome = "error"  # error handled by the method itself (see record_error)
+        except GraphThrottledError:
+            outcome = "throttled"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # GeneratorExit: an async generator method closed by its caller before the end (e.g. break)
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = "error"
+            self.record_error(operation, e)
+            raise
+        finally:
+            # not ContextVar.reset: an async generator can be closed from another context
+            _current_call.set(call.parent)
+            self.in_flight.dec(operation=operation)
+            self.calls.inc(operation=operation, outcome=outcome)
+            self.call_duration.observe(time.monotonic() - start, operation=operation)
+
+    def record_error(self, operation: str, error: Exception = None, error_class: str = None):
+        """
+        Count an error of a GraphClient call, given either as the exception or as its error class
+        (e.g. the status of a failed request of a JSON batch), and report the call in progress as failed.
+
+        An exception is counted once, by the innermost call it goes through (e.g. by iter_users for a page
+        that fails under get_users): the calls it reaches afterwards only get the 'error' outcome.
+        """
+        call = _current_call.get()
+        while call is not None and call.operation != operation:
+            call = call.parent
+        if call is not None:
+            call.failed = True
+
+        if error is not None and getattr(error, "_graph_metrics_counted", False):
+            return
+        if error_class is None:
+            error_class, _ = classify_error(error)
+        self.errors.inc(operation=operation, error_class=error_class)
+        logger.debug("%s failed: %s (%r)", operation, error_class, error)
+        if error is not None:
+            error._graph_metrics_counted = True
+
+    def attach(self, client):
+        """
+        Instrument a GraphClient: HTTP event hooks on its transport and export of its counters.
+        """
+        self.clients.add(client)
+        http_client = client.transport.http_client()
+        if http_client not in self.instrumented:
+            http_client.event_hooks["request"].append(self._on_request)
+            http_client.event_hooks["response"].append(self._on_response)
+            self.instrumented.add(http_client)
+
+    async def _on_request(self, request):
+        self.started[request] = time.monotonic()
+        self.http_sent.inc(int(request.headers.get("Content-Length") or 0), method=request.method)
+
+    async def _on_response(self, response):
+        request = response.request
+        start = self.started.pop(request, None)
+        if start is not None:
+            self.http_duration.observe(time.monotonic() - start, method=request.method)
+        self.http_requests.inc(method=request.method, status=response.status_code)
+        response.stream = CountingStream(response.stream, lambda size: self.http_received.inc(size, method=request.method))
+
+    def _collect_clients(self):
+        metrics = [
+            Counter("graph_rate_limiter_requests_total", "Attempts of the requests sent through the rate limiters."),
+            Counter("graph_rate_limiter_throttled_total", "Throttled responses (429/503), i.e. retries."),
+            Counter("graph_rate_limiter_throttled_failures_total", "Requests given up after all the retries."),
+            Counter("graph_batch_batches_total", "JSON batches sent."),
+            Counter("graph_batch_requests_total", "Requests sent inside JSON batches (retries included)."),
+            Counter("graph_batch_throttled_total", "Throttled requests inside JSON batches."),
+            Counter("graph_token_acquisitions_total", "Access tokens acquired."),
+            Counter("graph_token_waits_total", "Calls that waited for an access token."),
+            Counter("graph_lookup_cache_hits_total", "Object lookups answered from the lookup cache."),
+            Counter("graph_lookup_cache_misses_total", "Object lookups that sent a request."),
+            Counter("graph_lookup_cache_coalesced_total", "Object lookups that joined a request already in progress."),
+            Counter("graph_lookup_cache_evictions_total", "Entries evicted from the lookup cache (least recently used)."),
+        ]
+        concurrency_limit = Gauge("graph_rate_limiter_concurrency_limit", "Current adaptive concurrency limit per credential profile.", ("profile",))
+
+        # rate limiters, batchers, credentials and caches can be shared by several clients: each one is counted once
+        seen = set()
+        for client in list(self.clients):
+            rate_limiter, batcher, credential, cache = client.rate_limiter, client.batcher, client.credential, client.lookup_cache
+            values = [0] * len(metrics)
+            if id(rate_limiter) not in seen:
+                values[0:3] = rate_limiter.requests, rate_limiter.throttled, rate_limiter.throttled_failures
+                # the limiters of the clients of the same profile share its throttling budget
+                concurrency_limit.inc(rate_limiter.concurrency.limit, profile=client.profile_name)
+            if id(batcher) not in seen:
+                values[3:6] = batcher.batches, batcher.requests, batcher.throttled
+            if id(credential) not in seen:
+                token_stats = credential.stats()
+                values[6:8] = token_stats["acquisitions"], token_stats["waits"]
+            if id(cache) not in seen:
+                values[8:12] = cache.hits, cache.misses, cache.coalesced, cache.evictions
+            seen.update((id(rate_limiter), id(batcher), id(credential), id(cache)))
+            for metric, value in zip(metrics, values):
+                metric.inc(value)
+        return metrics[:3] + [concurrency_limit] + metrics[3:]
+
+    def report(self):
+        """
+        Print the calls, errors and latency of every GraphClient method.
+        """
+        for series in self.call_duration.summary():
+            operation = series["labels"]["operation"]
+            outcomes = {
+                labels["outcome"]: value for _, labels, value in self.calls.samples() if labels["operation"] == operation
+            }
+            errors = sum(value for _, labels, value in self.errors.samples() if labels["operation"] == operation)
+            print(
+                f"\t{operation}: {series['count']} calls ({', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))}), "
+                f"{errors} errors, p50 {series['p50'] * 1000:.0f} ms, p99 {series['p99'] * 1000:.0f} ms"
+            )
+
+
+class _TrackedCall:
+    __slots__ = ("operation", "parent", "failed")
+
+    def __init__(self, operation: str, parent):
+        self.operation = operation
+        self.parent = parent    # enclosing tracked call (e.g. get_users for iter_users)
+        self.failed = False
+
+
+def instrumented(operation: str):
+    """
+    Decorator of the GraphClient methods (coroutines and async generators) measuring every call with self.metrics.
+
+    An async generator closed by its caller before the end counts as a cancelled call. Callers that stop early should
+    close it (`await items.aclose()`, or contextlib.aclosing) rather than leave it to the garbage collector, which
+    closes it later: the call stays in flight until then.
+    """
+
+    def decorator(function):
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def wrapper(self, *args, **kwargs):
+                generator = function(self, *args, **kwargs)
+                with self.metrics.track(operation):
+                    try:
+                        async for item in generator:
+                            yield item
+                    finally:
+                        # a caller that stops early (break, aclose) closes the wrapped generator right away
+                        await generator.aclose()
+        else:
+            @functools.wraps(function)
+            async def wrapper(self, *args, **kwargs):
+                with self.metrics.track(operation):
+                    return await function(self, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,119 @@
+import json
+import os
+import zlib
+
+from dotenv import load_dotenv
+
+
+class CredentialProfile:
+    """
+    Credentials of an app registration used to call Microsoft Graph.
+
+    Every profile has its own Graph throttling budget (limits are enforced per app registration and per tenant),
+    so a sharded collection runs one shard per profile.
+    """
+
+    def __init__(self, name: str, tenant_id: str, client_id: str, client_secret: str):
+        self.name = name
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+
+    def __repr__(self):
+        return f"CredentialProfile(name={self.name}, tenant_id={self.tenant_id}, client_id={self.client_id})"
+
+    @classmethod
+    def from_env(cls, suffix: str = ""):
+        """
+        Build the profile defined by TENANT_ID<suffix>, CLIENT_ID<suffix> and CLIENT_SECRET<suffix>
+        (environment or .env file). TENANT_ID<suffix> defaults to TENANT_ID.
+
+        Returns:
+            CredentialProfile: The profile, or None if CLIENT_ID<suffix> is not defined.
+        """
+        load_dotenv()
+
+        client_id = os.getenv(f"CLIENT_ID{suffix}")
+        if client_id is None:
+            return None
+        return cls(
+            name=suffix.lstrip("_") or "default",
+            tenant_id=os.getenv(f"TENANT_ID{suffix}", os.getenv("TENANT_ID")),
+            client_id=client_id,
+            client_secret=os.getenv(f"CLIENT_SECRET{suffix}"),
+        )
+
+    @classmethod
+    def require_env(cls, suffix: str = ""):
+        """
+        Build the profile defined by the environment, as from_env() does.
+
+        Raises:
+            ValueError: If some of the variables of the profile are not defined (they are named in the message).
+        """
+        profile = cls.from_env(suffix)
+        missing = [
+            name for name, value in [
+                (f"TENANT_ID{suffix}", profile and profile.tenant_id),
+                (f"CLIENT_ID{suffix}", profile and profile.client_id),
+                (f"CLIENT_SECRET{suffix}", profile and profile.client_secret),
+            ]
+            if not value
+        ]
+        if missing:
+            raise ValueError(f"Missing Graph credentials: set {', '.join(missing)} (environment or .env file)")
+        return profile
+
+
+def load_profiles(path: str = None):
+    """
+    Load the credential profiles of a collection run.
+
+    Without `path`, the profiles come from the environment (.env): TENANT_ID/CLIENT_ID/CLIENT_SECRET is the
+    'default' profile, and more app registrations can be added with numbered variables
+    (CLIENT_ID_2/CLIENT_SECRET_2 and optionally TENANT_ID_2, then _3...).
+
+    With `path`, a JSON file with the list of the profiles:
+    [{"name": "...", "tenant_id": "...", "client_id": "...", "client_secret": "..."}, ...]
+
+    Args:
+        path (str, optional): JSON file of the profiles.
+
+    Returns:
+        list of CredentialProfile: The profiles, in definition order.
+
+    Raises:
+        ValueError: If two profiles have the same name, or if the credentials of the default profile are not defined.
+    """
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as profiles_file:
+            profiles = [
+                CredentialProfile(
+                    name=str(entry.get("name", i + 1)),
+                    tenant_id=entry["tenant_id"],
+                    client_id=entry["client_id"],
+                    client_secret=entry["client_secret"],
+                )
+                for i, entry in enumerate(json.load(profiles_file))
+            ]
+    else:
+        profiles = [CredentialProfile.require_env()]
+        n = 2
+        while (profile := CredentialProfile.from_env(f"_{n}")) is not None:
+            profiles.append(profile)
+            n += 1
+
+    names = [profile.name for profile in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate credential profile names: {names}")
+    return profiles
+
+
+def shard_of(template_id: str, shard_count: int):
+    """
+    Return the shard (0 to shard_count - 1) a template belongs to.
+
+    The assignment is a stable hash of the template ID: with the same profiles, a template always goes to the same
+    shard, so the journal of every shard can be resumed or updated incrementally.
+    """
+    return zlib.crc32(template_id.encode("utf-8")) % shard_count
@@ -0,0 +1,188 @@
+import asyncio
+import random
+import time
+
+from utils.errors import GraphThrottledError, get_response_header, get_status_code, is_throttling_error, parse_retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all the requests of a GraphClient.
+
+    Tokens are refilled at `rate` per second up to `capacity`: every request consumes one token,
+    so short bursts are allowed while the long-term request rate stays bounded.
+    When Graph answers with a Retry-After header the whole bucket is paused, so that every caller
+    (not only the throttled one) waits before sending new requests.
+    """
+
+    def __init__(self, rate: float = 20.0, capacity: int = 40):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = None  # created lazily, inside the running event loop
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for the given number of seconds (e.g. the value of Retry-After).
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Wait until a token is available and consume it.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on the number of in-flight requests that adapts to the responses (AIMD).
+
+    The limit grows additively (about +1 every `limit` healthy responses) and is cut
+    multiplicatively when a request is throttled, at most once per `cooldown` seconds
+    so that a burst of 429 responses counts as a single congestion signal.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64, decrease_factor: float = 0.5, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._condition = None  # created lazily, inside the running event loop
+
+    def _get_condition(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            condition.notify_all()
+
+
+class RateLimiter:
+    """
+    Client-wide rate-limit subsystem used by GraphClient for every call to Microsoft Graph.
+
+    Each call goes through:
+    - a shared TokenBucket (request rate)
+    - an AdaptiveConcurrency limit (in-flight requests)
+    - retries of the throttled responses (429/503), waiting for Retry-After when present
+      and for a jittered exponential backoff otherwise
+
+    If a call is still throttled after `max_retries` retries a GraphThrottledError is raised,
+    while any other error is re-raised untouched.
+    """
+
+    def __init__(self, bucket: TokenBucket = None, concurrency: AdaptiveConcurrency = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.bucket = bucket or TokenBucket()
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # counters
+        self.requests = 0
+        self.throttled = 0              # throttled responses (each retry counts)
+        self.throttled_failures = 0     # calls given up after max_retries
+
+    def backoff(self, attempt: int):
+        """
+        Exponential backoff with full jitter for the given (1-based) retry attempt.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, operation, timeout: float = None):
+        """
+        Run a Graph request under the rate limits.
+
+        Args:
+            operation (callable): Function with no arguments returning a new awaitable for each attempt
+                (e.g. `lambda: client.users.get()`).
+            timeout (float, optional): Timeout of every single attempt, in seconds (asyncio.TimeoutError when exceeded).
+
+        Returns:
+            The result of the awaitable.
+
+        Raises:
+            GraphThrottledError: If the request is still throttled after all the retries.
+        """
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            await self.concurrency.acquire()
+            self.requests += 1
+
+            throttled = False
+            try:
+                if timeout is None:
+                    return await operation()
+                return await asyncio.wait_for(operation(), timeout)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                throttled = True
+                error = e
+            finally:
+                await self.concurrency.release(throttled=throttled)
+
+            self.throttled += 1
+            attempt += 1
+            retry_after = getattr(error, "retry_after", None)
+            if retry_after is None:
+                retry_after = parse_retry_after(get_response_header(error, "Retry-After"))
+
+            if attempt > self.max_retries:
+                self.throttled_failures += 1
+                raise GraphThrottledError(
+                    f"Request still throttled after {self.max_retries} retries",
+                    status_code=get_status_code(error),
+                    retry_after=retry_after,
+                ) from error
+
+            if retry_after is not None:
+                # Retry-After applies to the whole client, not only to this request
+                self.bucket.pause(retry_after)
+                delay = retry_after + random.uniform(0, self.base_delay)
+            else:
+                delay = self.backoff(attempt)
+            await asyncio.sleep(delay)
@@ -0,0 +1,245 @@
+import collections
+import datetime
+import re
+
+
+class Record:
+    """
+    Lightweight read-only view of a Graph object, built from its JSON.
+
+    Record types are slotted classes created once per set of fields (see record_type()), so an instance only
+    holds the values of its fields: no per-instance dictionary, backing store or model graph as with the SDK
+    models. Attribute names are the snake_case names used by the SDK models (e.g. 'app_id'), and nested
+    objects are records as well, so code written against the models (obj.web.redirect_uris) keeps working.
+    Reading a field that is not part of the record (e.g. not projected) raises AttributeError: use get()
+    for optional fields.
+    """
+
+    __slots__ = ()
+
+    # records hold lists: they compare by value and are not hashable
+    __hash__ = None
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def __eq__(self, other):
+        # compared by name and fields rather than by class: a record type evicted from the cache is created again
+        return (
+            isinstance(other, Record) and type(self).__name__ == type(other).__name__ and self.__slots__ == other.__slots__
+            and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+        )
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        # record types are created at runtime: pickle the type by its name and fields
+        return _rebuild, (type(self).__name__, self.__slots__, tuple(getattr(self, name) for name in self.__slots__))
+
+    def get(self, name: str, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The fields of the record, with the nested records converted to dictionaries as well.
+        """
+        return {name: _to_value(getattr(self, name)) for name in self.__slots__}
+
+
+def _to_value(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_value(item) for item in value]
+    return value
+
+
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+# Fields of every SDK model: the OData type and the keys of the JSON unknown to the model
+MODEL_FIELDS = ("additional_data", "odata_type")
+
+# Maximum number of record types and of JSON keys kept in the caches below: the sets of fields of the objects
+# that are not projected depend on the responses
+MAX_RECORD_TYPES = 1024
+MAX_FIELD_NAMES = 4096
+
+_record_types = collections.OrderedDict()  # (name, fields) -> record class, least recently used first
+_field_names = {}                          # JSON key -> attribute name (None for the annotations that are dropped)
+
+# ISO 8601 datetime as sent by Graph (e.g. '2024-01-01T10:00:00.1234567Z'): seconds, fraction and offset
+_DATETIME = re.compile(r"(.*T\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)?$")
+
+
+def record_type(name: str, fields: tuple):
+    """
+    Return the slotted record class with the given fields, created on first use and reused afterwards
+    (the MAX_RECORD_TYPES most recently used classes are kept).
+    """
+    key = (name, fields)
+    cls = _record_types.get(key)
+    if cls is None:
+        cls = type(name, (Record,), {"__slots__": fields})
+        _record_types[key] = cls
+        while len(_record_types) > MAX_RECORD_TYPES:
+            _record_types.popitem(last=False)
+    else:
+        _record_types.move_to_end(key)
+    return cls
+
+
+def _rebuild(name: str, fields: tuple, values: tuple):
+    return record_type(name, fields)(*values)
+
+
+def field_name(key: str):
+    """
+    Convert a JSON key of a Graph response (e.g. 'appId') to the attribute name of the SDK models (e.g. 'app_id').
+    '@odata.type' becomes 'odata_type'; the other OData annotations (e.g. '@odata.context') are dropped (None).
+    """
+    name = _field_names.get(key, False)
+    if name is False:
+        if key == "@odata.type":
+            name = "odata_type"
+        elif "@" in key:
+            name = None
+        else:
+            name = "".join(f"_{char.lower()}" if char.isupper() else char for char in key)
+        if len(_field_names) >= MAX_FIELD_NAMES:
+            _field_names.clear()  # e.g. free-form objects keyed by URLs: the names are cheap to compute again
+        _field_names[key] = name
+    return name
+
+
+def parse_datetime(value: str):
+    """
+    Parse a datetime of a Graph response, as the SDK models do (e.g. '2024-01-01T10:00:00Z' becomes an aware
+    datetime, written back as '2024-01-01T10:00:00+00:00'). Values that are not datetimes are returned unchanged.
+    """
+    match = _DATETIME.match(value)
+    if match is None:
+        return value
+    seconds, fraction, offset = match.groups()
+    text = seconds
+    if fraction:
+        text += "." + fraction[:6].ljust(6, "0")  # Graph sends up to 7 digits, datetime keeps microseconds
+    if offset:
+        text += "+00:00" if offset == "Z" else offset
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return value
+
+
+class RecordSchema:
+    """
+    Layout of the records of an object type, e.g. the fields of an SDK model (see utils.serializer.model_schema):
+    the fields in order, their default values and the schemas of the fields holding nested objects.
+    """
+
+    def __init__(self, name: str, fields: tuple, defaults: dict = None, nested: dict = None):
+        """
+        Args:
+            name (str): Name of the record type (e.g. 'Application').
+            fields (tuple): Every field of the records, in order.
+            defaults (dict, optional): field -> value of the fields missing from the JSON (None if not given).
+            nested (dict, optional): field -> RecordSchema of the objects (or lists of objects) held by the field.
+        """
+        self.name = name
+        self.fields = tuple(fields)
+        self.known = frozenset(self.fields)
+        self.defaults = defaults or {}
+        self.nested_schemas = nested or {}
+
+    def nested(self, field: str):
+        """
+        Return the schema of the objects held by a field, or None (scalars and free-form objects).
+        """
+        return self.nested_schemas.get(field)
+
+
+def _convert(field: str, value, schema: RecordSchema = None):
+    # nested objects become records, datetimes (the '...DateTime' properties of Graph) datetime objects
+    value_type = type(value)
+    if value_type is str:
+        return parse_datetime(value) if field.endswith("_date_time") else value
+    if value_type in _SCALAR_TYPES:
+        return value
+    nested = schema.nested(field) if schema is not None else None
+    return to_record(value, nested.name if nested is not None else "Record", schema=nested)
+
+
+def to_record(data, name: str = "Record", select: list = None, schema: RecordSchema = None):
+    """
+    Build a record from a parsed JSON value (e.g. an object of a Graph response).
+
+    Only the selected fields are converted: the other values of the JSON are never turned into records,
+    and are released together with the parsed response. Values get the types of the SDK models: nested
+    objects become records and datetimes datetime objects.
+
+    With a schema (e.g. the schema of the SDK model, see utils.serializer.model_schema) records have the layout of
+    the models, as written by the serializer: every field of the model, with its default value when it is missing
+    from the JSON, the keys of the JSON unknown to the model in 'additional_data', and nested objects laid out by
+    the schemas of their models. Without a schema, every key of the JSON is a field, plus 'additional_data' and
+    'odata_type'.
+
+    Args:
+        data: Parsed JSON value: objects become records, lists are converted item by item.
+        name (str): Name of the record type of the top-level object (e.g. 'ServicePrincipal').
+        select (list, optional): Fields of the top-level object to keep (snake_case or camelCase names,
+            as passed to the $select of the GraphClient methods). If None, every field is kept.
+        schema (RecordSchema, optional): Layout of the object.
+
+    Returns:
+        Record (or the converted value if `data` is not an object).
+    """
+    if type(data) is list:
+        return [item if type(item) in _SCALAR_TYPES else to_record(item, name, schema=schema) for item in data]
+    if type(data) is not dict:
+        return data
+
+    defaults = schema.defaults if schema is not None else {}
+    if select is not None:
+        by_field = {field_name(key): value for key, value in data.items()}
+        names = tuple(dict.fromkeys(field_name(field.strip()) for field in select))  # ordered, without duplicates
+        values = [_convert(field, by_field[field], schema) if field in by_field else defaults.get(field) for field in names]
+        return record_type(name, names)(*values)
+
+    by_field = {}
+    additional_data = {}
+    known = schema.known if schema is not None else None
+    for key, value in data.items():
+        field = _field_names.get(key, False)
+        if field is False:
+            field = field_name(key)
+        if field is None:
+            continue
+        if known is not None and field not in known:
+            additional_data[key] = value  # unknown to the model: kept as sent by Graph
+        else:
+            by_field[field] = value
+
+    if schema is None:
+        names = tuple(by_field)
+        if not all(field.isidentifier() for field in names):
+            # free-form object (e.g. keys that are URLs): kept as a dictionary
+            return {field: _convert(field, value) for field, value in by_field.items()}
+        names += tuple(field for field in MODEL_FIELDS if field not in by_field)
+    else:
+        names = schema.fields
+
+    values = [
+        additional_data if field == "additional_data"
+        else _convert(field, by_field[field], schema) if field in by_field
+        else defaults.get(field)
+        for field in names
+    ]
+    return record_type(name, names)(*values)
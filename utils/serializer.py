@@ -0,0 +1,247 @@
+import base64
+import dataclasses
+import datetime
+import enum
+import importlib
+import re
+import sys
+import typing
+import uuid
+
+from utils.records import Record, RecordSchema
+
+
+# Attributes of the SDK models that are not Graph data (e.g. the backing store of the msgraph models)
+SKIPPED_FIELDS = {"backing_store"}
+
+# Types that are already JSON values
+SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class ModelSerializer:
+    """
+    Converts Kiota/msgraph models into JSON-serializable dictionaries.
+
+    The list of fields of every model class is computed once (its "field plan") and reused for all the
+    objects of that class, and the converter of every value type is looked up in a dictionary instead of
+    walking an isinstance chain for each value. Values keep their JSON type when they have one:
+    UUIDs become their canonical string, dates and datetimes ISO 8601 strings, enums their value and
+    bytes base64 strings.
+    """
+
+    def __init__(self):
+        self.plans = {}         # model class -> tuple of field names
+        self.converters = {     # value type -> converter
+            str: _identity,
+            int: _identity,
+            float: _identity,
+            bool: _identity,
+            type(None): _identity,
+            list: self._convert_list,
+            tuple: self._convert_list,
+            set: self._convert_list,
+            dict: self._convert_dict,
+            uuid.UUID: str,
+            datetime.datetime: _isoformat,
+            datetime.date: _isoformat,
+            datetime.time: _isoformat,
+            datetime.timedelta: _timedelta,
+            bytes: _base64,
+        }
+
+    def serialize(self, obj):
+        """
+        Convert an object (model, list, dict or scalar) to a JSON-serializable value.
+        """
+        converter = self.converters.get(type(obj))
+        if converter is None:
+            converter = self._resolve(obj)
+        return converter(obj)
+
+    __call__ = serialize
+
+    def _resolve(self, obj):
+        # first object of this type: pick its converter once
+        cls = type(obj)
+        if issubclass(cls, enum.Enum):
+            converter = _enum_value
+        elif issubclass(cls, (str, int, float)):
+            converter = _identity  # e.g. str/int subclasses
+        elif issubclass(cls, (list, tuple, set)):
+            converter = self._convert_list
+        elif issubclass(cls, dict):
+            converter = self._convert_dict
+        elif issubclass(cls, datetime.date):
+            converter = _isoformat
+        elif issubclass(cls, Record):
+            converter = self._convert_record
+        elif dataclasses.is_dataclass(cls) or hasattr(obj, "__dict__"):
+            converter = self._convert_model
+        else:
+            converter = str  # fallback to string, as the previous serializer did
+        self.converters[cls] = converter
+        return converter
+
+    def _plan(self, cls):
+        plan = self.plans.get(cls)
+        if plan is None:
+            plan = model_fields(cls)
+            self.plans[cls] = plan
+        return plan
+
+    def _convert_model(self, obj):
+        cls = type(obj)
+        if dataclasses.is_dataclass(cls):
+            values = getattr(obj, "__dict__", None)
+            if values is not None:
+                items = [(name, values.get(name)) for name in self._plan(cls)]
+            else:
+                items = [(name, getattr(obj, name, None)) for name in self._plan(cls)]  # slotted dataclass
+        else:
+            # no declared fields: the attributes can change from one object to another
+            items = [(name, value) for name, value in vars(obj).items() if not name.startswith("_") and name not in SKIPPED_FIELDS]
+
+        converters = self.converters
+        result = {}
+        for name, value in items:
+            value_type = type(value)
+            if value_type in SCALAR_TYPES:
+                result[name] = value  # most of the values: no conversion needed
+            else:
+                converter = converters.get(value_type) or self._resolve(value)
+                result[name] = converter(value)
+        return result
+
+    def _convert_record(self, record):
+        # records hold JSON values, datetimes, lists and other records
+        result = {}
+        for name in record.__slots__:
+            value = getattr(record, name)
+            result[name] = value if type(value) in SCALAR_TYPES else self.serialize(value)
+        return result
+
+    def _convert_list(self, items):
+        serialize = self.serialize
+        return [item if type(item) in SCALAR_TYPES else serialize(item) for item in items]
+
+    def _convert_dict(self, mapping):
+        serialize = self.serialize
+        return {str(key): value if type(value) in SCALAR_TYPES else serialize(value) for key, value in mapping.items()}
+
+
+def model_fields(cls):
+    """
+    Return the fields of a model class written by the serializer (e.g. the keys of a serialized msgraph Application),
+    or None if the class declares no fields.
+    """
+    schema = model_schema(cls)
+    return schema.fields if schema is not None else None
+
+
+# Identifiers of a type annotation that can name a model (e.g. 'ApiApplication' in 'Optional[ApiApplication]')
+_ANNOTATION_NAMES = re.compile(r"\b[A-Z]\w*")
+_TYPING_NAMES = frozenset(("Optional", "Union", "List", "Dict", "Set", "Tuple", "Any", "UUID"))
+_UNRESOLVED = object()
+
+_schemas = {}  # model class -> ModelSchema
+
+
+class ModelSchema(RecordSchema):
+    """
+    Record layout of an SDK model (see utils.records.to_record): the fields written by the serializer, the default
+    values of the model (e.g. the OData type of the entities) and, resolved on first use, the schemas of the models
+    held by its fields.
+    """
+
+    def __init__(self, cls):
+        fields = [
+            field for field in dataclasses.fields(cls)
+            if not field.name.startswith("_") and field.name not in SKIPPED_FIELDS
+        ]
+        defaults = {
+            field.name: field.default for field in fields
+            if field.default is not dataclasses.MISSING and field.default is not None
+        }
+        super().__init__(cls.__name__, tuple(field.name for field in fields), defaults)
+        self.model = cls
+        self.annotations = {field.name: field.type for field in fields}
+
+    def nested(self, field: str):
+        schema = self.nested_schemas.get(field, _UNRESOLVED)
+        if schema is _UNRESOLVED:
+            schema = _annotation_schema(self.model, self.annotations.get(field))
+            self.nested_schemas[field] = schema
+        return schema
+
+
+def model_schema(cls):
+    """
+    Return the ModelSchema of a model class (created once per class), or None if the class declares no fields.
+    """
+    schema = _schemas.get(cls)
+    if schema is None and dataclasses.is_dataclass(cls) and isinstance(cls, type):
+        schema = ModelSchema(cls)
+        _schemas[cls] = schema
+    return schema
+
+
+def _annotation_schema(model, annotation):
+    # the msgraph models postpone their annotations (e.g. 'Optional[list[AppRole]]') and import the nested
+    # models only for type checking: they are looked up in the module of the model, then in their own module
+    if annotation is None:
+        return None
+    if isinstance(annotation, typing.ForwardRef):
+        annotation = annotation.__forward_arg__
+    if not isinstance(annotation, str):
+        if isinstance(annotation, type) and dataclasses.is_dataclass(annotation):
+            return model_schema(annotation)
+        for argument in typing.get_args(annotation):  # e.g. Optional[list[AppRole]]
+            schema = _annotation_schema(model, argument)
+            if schema is not None:
+                return schema
+        return None
+    for name in _ANNOTATION_NAMES.findall(annotation):
+        if name in _TYPING_NAMES:
+            continue
+        cls = _model_class(model, name)
+        if cls is not None:
+            return model_schema(cls)
+    return None
+
+
+def _model_class(model, name: str):
+    cls = getattr(sys.modules.get(model.__module__), name, None)
+    if cls is None:
+        package = model.__module__.rpartition(".")[0]
+        if not package:
+            return None
+        module_name = re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()  # e.g. OAuth2PermissionGrant -> o_auth2_permission_grant
+        try:
+            cls = getattr(importlib.import_module(f"{package}.{module_name}"), name, None)
+        except ImportError:
+            return None
+    return cls if isinstance(cls, type) and dataclasses.is_dataclass(cls) else None
+
+
+def _identity(value):
+    return value
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _timedelta(value):
+    return value.total_seconds()
+
+
+def _base64(value):
+    return base64.b64encode(value).decode("ascii")
+
+
+def _enum_value(value):
+    return value.value
+
+
+# Shared instance: the field plans are reused by every caller
+to_serializable = ModelSerializer()
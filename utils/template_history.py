@@ -0,0 +1,168 @@
+import contextlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+DAY = 24 * 3600
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    Hold an exclusive lock on `path` (a sidecar lock file, created if needed) across processes.
+    """
+    with open(path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TemplateHistory:
+    """
+    Persistent history of the instantiation of every application template across runs.
+
+    It works as a negative cache: a template that failed is skipped until its entry expires, and then
+    re-probed. Permanent errors (e.g. 400: the template cannot be instantiated) and transient errors
+    (e.g. 500, timeouts) have separate retry policies, and the time to live doubles every time the same
+    template fails again, so known-bad templates are re-probed more and more rarely.
+
+    It also remembers how long every instantiation took, so that the slowest templates can be started first.
+    """
+
+    def __init__(self, path: str = "data/cache/template_history.json",
+                 permanent_ttl: float = 30 * DAY, transient_ttl: float = 6 * 3600,
+                 max_permanent_ttl: float = 180 * DAY, max_transient_ttl: float = 7 * DAY):
+        """
+        Args:
+            path (str): JSON file of the history.
+            permanent_ttl (float): Seconds a template with a permanent error is skipped after its first failure.
+            transient_ttl (float): Seconds a template with a transient error is skipped after its first failure.
+            max_permanent_ttl (float): Upper bound of the permanent error TTL after repeated failures.
+            max_transient_ttl (float): Upper bound of the transient error TTL after repeated failures.
+        """
+        self.path = path
+        self.permanent_ttl = permanent_ttl
+        self.transient_ttl = transient_ttl
+        self.max_permanent_ttl = max_permanent_ttl
+        self.max_transient_ttl = max_transient_ttl
+
+        # template ID -> {'duration', 'error_class', 'permanent', 'failures', 'last_failed', 'expires_at'}
+        self.entries = self._load()
+        self.updated = set()    # templates recorded by this instance
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as history_file:
+                return json.load(history_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Save the history, keeping the entries saved in the meantime by other processes (e.g. the other shards
+        of a sharded collection) for the templates not recorded by this instance.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # the read-merge-replace is locked: a process saving in the meantime would otherwise drop the entries of this one
+        with file_lock(f"{self.path}.lock"):
+            entries = self._load()
+            entries.update({template_id: self.entries[template_id] for template_id in self.updated})
+            self.entries = entries
+
+            # unique partial file: several processes may save at the same time
+            partial_path = f"{self.path}.{os.getpid()}.partial"
+            with open(partial_path, "w", encoding="utf-8") as history_file:
+                json.dump(self.entries, history_file)
+            os.replace(partial_path, self.path)
+
+    def record_success(self, template_id: str, duration: float):
+        """
+        Record a successful instantiation: the template is not in the negative cache anymore.
+        """
+        self.entries[template_id] = {"duration": duration}
+        self.updated.add(template_id)
+
+    def record_failure(self, template_id: str, error_class: str, permanent: bool, duration: float = None):
+        """
+        Record a failed instantiation and put the template in the negative cache.
+        """
+        entry = self.entries.get(template_id, {})
+        # the backoff only grows while the template keeps failing with the same kind of error
+        failures = entry.get("failures", 0) + 1 if entry.get("permanent") == permanent else 1
+
+        if permanent:
+            ttl = min(self.max_permanent_ttl, self.permanent_ttl * 2 ** (failures - 1))
+        else:
+            ttl = min(self.max_transient_ttl, self.transient_ttl * 2 ** (failures - 1))
+
+        now = time.time()
+        self.entries[template_id] = {
+            "duration": duration if duration is not None else entry.get("duration"),
+            "error_class": error_class,
+            "permanent": permanent,
+            "failures": failures,
+            "last_failed": now,
+            "expires_at": now + ttl,
+        }
+        self.updated.add(template_id)
+
+    def is_skipped(self, template_id: str, now: float = None):
+        """
+        Return True if the template failed recently and is still in the negative cache.
+        """
+        entry = self.entries.get(template_id)
+        if not entry or "expires_at" not in entry:
+            return False
+        return (now or time.time()) < entry["expires_at"]
+
+    def error_class(self, template_id: str):
+        return self.entries.get(template_id, {}).get("error_class")
+
+    def schedule(self, items: list):
+        """
+        Split the templates to collect into the ones to run, slowest first, and the ones to skip.
+
+        Templates without a recorded duration are placed as if they took the median time.
+
+        Args:
+            items (list of tuple): (index, template dict) pairs.
+
+        Returns:
+            tuple: (items to run, items skipped by the negative cache).
+        """
+        now = time.time()
+        skipped = [item for item in items if self.is_skipped(item[1].get("id"), now)]
+        to_run = [item for item in items if not self.is_skipped(item[1].get("id"), now)]
+
+        durations = sorted(
+            entry["duration"] for entry in self.entries.values() if entry.get("duration") is not None
+        )
+        median = durations[len(durations) // 2] if durations else 0.0
+
+        def expected_duration(item):
+            duration = self.entries.get(item[1].get("id"), {}).get("duration")
+            return median if duration is None else duration
+
+        # stable sort: templates with the same expected duration keep the catalog order
+        to_run.sort(key=expected_duration, reverse=True)
+        return to_run, skipped
@@ -0,0 +1,102 @@
+import importlib.util
+
+
+# Default timeout (seconds) of a single attempt of each type of operation
+DEFAULT_TIMEOUTS = {
+    "list": 60.0,           # one page of a collection
+    "get": 30.0,            # single object
+    "instantiate": 120.0,   # POST /applicationTemplates/{id}/instantiate
+    "delete": 30.0,
+    "batch": 90.0,          # POST /$batch (up to 20 requests)
+}
+
+
+class GraphTransport:
+    """
+    Pooled async HTTP transport (httpx) for the GraphClient instances.
+
+    A single connection pool is created lazily and shared by every GraphClient using this transport,
+    so concurrent requests reuse warm TLS connections (keep-alive) and, with HTTP/2, are multiplexed
+    over a few connections. The Graph SDK middleware (redirects, telemetry...) is added on top of the pool
+    as with the default transport of GraphServiceClient, except for its retries: the RetryHandler is disabled,
+    so that throttled responses reach the RateLimiter (the only place that retries, one attempt per timeout).
+
+    HTTP/2 requires the optional `h2` package (pip install "httpx[http2]"): without it HTTP/1.1 is used.
+    """
+
+    _shared = None
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0,
+                 http2: bool = True, connect_timeout: float = 10.0, timeouts: dict = None, event_hooks: dict = None):
+        """
+        Args:
+            max_connections (int): Maximum number of open connections of the pool.
+            max_keepalive_connections (int): Maximum number of idle connections kept open.
+            keepalive_expiry (float): Seconds an idle connection is kept open.
+            http2 (bool): If True (and h2 is installed), negotiate HTTP/2.
+            connect_timeout (float): Timeout of the TCP/TLS connection, in seconds.
+            timeouts (dict, optional): Timeout of a single attempt per operation type
+                ('list', 'get', 'instantiate', 'delete', 'batch'), merged with DEFAULT_TIMEOUTS.
+            event_hooks (dict, optional): httpx event hooks ({'request': [...], 'response': [...]}, async functions),
+                e.g. to measure the latency of every request.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.connect_timeout = connect_timeout
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.event_hooks = event_hooks
+        self._http_client = None
+
+    @classmethod
+    def shared(cls):
+        """
+        Return the transport shared by default by all the GraphClient instances of the process.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def timeout(self, operation: str):
+        """
+        Return the timeout (seconds) of a single attempt of the given operation type.
+        """
+        return self.timeouts.get(operation)
+
+    def http_client(self):
+        """
+        Return the pooled httpx.AsyncClient (with the Graph SDK middleware), created on first use.
+        """
+        if self._http_client is None:
+            # imported on first use: building a transport (e.g. to parse the options of a script) does not load httpx
+            # nor the Graph SDK
+            import httpx
+            from kiota_http.middleware.options import RetryHandlerOption
+            from msgraph_core import GraphClientFactory
+
+            # per-operation timeouts are enforced by GraphClient: httpx only bounds the connection phase
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(None, connect=self.connect_timeout),
+                event_hooks=self.event_hooks,
+            )
+            # no hidden retries (429/503/504 with Retry-After) inside a single RateLimiter.call
+            no_retries = RetryHandlerOption(max_retries=0, should_retry=False)
+            self._http_client = GraphClientFactory.create_with_default_middleware(
+                client=client, options={RetryHandlerOption.get_key(): no_retries}
+            )
+        return self._http_client
+
+    async def aclose(self):
+        """
+        Close the pooled connections.
+        """
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
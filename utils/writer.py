@@ -0,0 +1,216 @@
+import gzip
+import json
+import os
+
+
+# File extension added by each supported compression
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def open_compressed(path: str, compression: str = None):
+    """
+    Open a text file for writing (UTF-8), optionally compressed with gzip or zstd.
+
+    zstd requires the optional `zstandard` package (pip install zstandard).
+    """
+    if compression is None:
+        return open(path, "w", encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the zstandard package: pip install zstandard") from e
+        return zstandard.open(path, "w", encoding="utf-8")
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+def read_records(path: str, compression: str = None):
+    """
+    Iterate over the records of a file written by RecordWriter (ndjson files are read one line at a time).
+    """
+    if compression is None:
+        records_file = open(path, "r", encoding="utf-8")
+    elif compression == "gzip":
+        records_file = gzip.open(path, "rt", encoding="utf-8")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the zstandard package: pip install zstandard") from e
+        records_file = zstandard.open(path, "r", encoding="utf-8")
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    with records_file:
+        if ".ndjson" in os.path.basename(path):
+            for line in records_file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(records_file)
+
+
+class RecordWriter:
+    """
+    Writes a sequence of JSON records to a file, one record at a time.
+
+    The records go to `<path>.partial` while the run is in progress and the file is moved to `path`
+    only when the writer is closed, so `path` is never left half-written.
+
+    Formats:
+    - 'ndjson': one JSON record per line (the partial file can be read while the run is in progress)
+    - 'json': a JSON array laid out as json.dump(records, indent=2) would write it
+    """
+
+    def __init__(self, path: str, format: str = "ndjson", compression: str = None, flush_every: int = 50):
+        if format not in ("ndjson", "json"):
+            raise ValueError(f"Unsupported format: {format}")
+
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.format = format
+        self.flush_every = flush_every
+        self.count = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open_compressed(self.partial_path, compression)
+        if format == "json":
+            self.file.write("[")
+
+    def write(self, record):
+        if self.format == "ndjson":
+            self.file.write(json.dumps(record, ensure_ascii=False))
+            self.file.write("\n")
+        else:
+            # same layout as json.dump(records, indent=2): every item indented by one more level
+            self.file.write(",\n  " if self.count else "\n  ")
+            self.file.write(json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+    def close(self):
+        """
+        Complete the file and atomically move it to its final path.
+        """
+        if self.format == "json":
+            self.file.write("\n]" if self.count else "]")
+        self.file.flush()
+        if hasattr(self.file, "fileno"):
+            try:
+                os.fsync(self.file.fileno())
+            except (OSError, ValueError):
+                pass  # e.g. compressed streams without a file descriptor
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        """
+        Close the writer without replacing the final file (the partial file is kept for inspection).
+        """
+        self.file.close()
+
+
+class CollectionWriter:
+    """
+    Output stage of collect(): writes the collected applications and service principals
+    to two files under `directory`.
+
+    - 'ndjson': records are appended as soon as they are collected (e.g. data/all_applications.ndjson.gz)
+    - 'json': today's layout (data/all_applications.json, data/all_service_principals.json) in template order,
+      written when the run finishes by streaming the records back from the run journal
+
+    In both modes memory does not grow with the catalog, and the final files are replaced atomically.
+    """
+
+    def __init__(self, directory: str = "data", format: str = "json", compression: str = None):
+        if format == "json" and compression is not None:
+            raise ValueError("Compression is only supported with the ndjson format")
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+        self.directory = directory
+        self.format = format
+        self.compression = compression
+        self.writers = None
+
+    def paths(self):
+        """
+        Returns:
+            tuple: (applications path, service principals path).
+        """
+        extension = ".json" if self.format == "json" else ".ndjson" + COMPRESSION_EXTENSIONS[self.compression]
+        return (
+            os.path.join(self.directory, f"all_applications{extension}"),
+            os.path.join(self.directory, f"all_service_principals{extension}"),
+        )
+
+    def _open(self):
+        applications_path, service_principals_path = self.paths()
+        self.writers = (
+            RecordWriter(applications_path, self.format, self.compression),
+            RecordWriter(service_principals_path, self.format, self.compression),
+        )
+
+    def _write(self, application: dict, service_principal: dict):
+        self.writers[0].write(application)
+        self.writers[1].write(service_principal)
+
+    def open(self, collected=()):
+        """
+        Start the output of a run.
+
+        Args:
+            collected (iterable, optional): (application, service principal) pairs collected by a previous run
+                that is being resumed, written first in ndjson mode.
+        """
+        if self.format == "ndjson":
+            self._open()
+            for application, service_principal in collected:
+                self._write(application, service_principal)
+
+    def write(self, application: dict, service_principal: dict):
+        """
+        Write a collected application and its service principal (ndjson only: the json layout is written on close).
+        """
+        if self.format == "ndjson":
+            self._write(application, service_principal)
+
+    def close(self, collected=()):
+        """
+        Complete the output of a run and move the files to their final paths.
+
+        Args:
+            collected (iterable, optional): Every (application, service principal) pair of the run in template order,
+                written in json mode.
+        """
+        if self.format == "json":
+            self._open()
+            for application, service_principal in collected:
+                self._write(application, service_principal)
+        for writer in self.writers:
+            writer.close()
+        self.writers = None
+
+    def read(self):
+        """
+        Iterate over the collected data of the output files.
+
+        Yields:
+            tuple: (application dict, service principal dict), in output order.
+        """
+        applications_path, service_principals_path = self.paths()
+        yield from zip(read_records(applications_path, self.compression), read_records(service_principals_path, self.compression))
+
+    def abort(self):
+        """
+        Stop the output of an interrupted run, keeping the final files of the previous run untouched.
+        """
+        for writer in self.writers or ():
+            writer.abort()
+        self.writers = None